@@ -18,23 +18,33 @@ from hackerbabel.clients.mongodb_client import MongoDBClient
 from hackerbabel.clients.hackernews_client import HackerNewsClient
 from hackerbabel.clients.unbabel_client import UnbabelClient
 
+from hackerbabel.src.assets import AssetPipeline
 from hackerbabel.src.configuration import config_selector
 from hackerbabel.src.daemon import HackerNewsDaemon
 from hackerbabel.src.error_handlers import register_error_handlers
+from hackerbabel.src.fragments import FragmentRenderer
 from hackerbabel.src.logger import setup_logger
+from hackerbabel.src.profiling import create_profiler
+from hackerbabel.src.scheduler import TranslationPoller, TranslationScheduler
+from hackerbabel.src.translation_memory import TranslationMemory
 
 from hackerbabel.views.index import INDEX
 from hackerbabel.views.dashboard import DASHBOARD
 from hackerbabel.views.comment_section import COMMENT_SECTION
+from hackerbabel.views.feed import FEED
+from hackerbabel.views.metrics import METRICS
 
 # CONST
 LOGGER = logging.getLogger(__name__)
 
 
-def setup_app():
+def setup_app(config_overrides=None):
     """
     Setup and run Flask app
 
+    @param config_overrides: Config entries replacing those of the config file
+    and environment variables, e.g. for tests and benchmarks.
+    @type config_overrides: dict or None
     @return: app which could be launched immediately
     @rtype: Flask
     """
@@ -48,9 +58,11 @@ def setup_app():
 
     # 2 Update the apps configuration
     app = config_selector(app)
+    app.config.update(config_overrides or {})
     register_error_handlers(app)
 
     cache.init_app(app)
+    cache.app = app  # Daemons invalidate cached pages outside of requests
 
     # 3 Set up logger
     setup_logger(app.config)
@@ -60,11 +72,22 @@ def setup_app():
     init_clients(app.config)
 
     # 5 Init Daemon
-    start_daemon(app.config)
+    fragment_renderer = FragmentRenderer(
+        app.jinja_env,
+        app.config.get("SOURCE_LANGUAGE", "EN"),
+        app.config.get("COMMENTS_PER_PAGE", 20)
+    )
+    app.extensions["fragments"] = fragment_renderer
+    profiler = create_profiler(app.config)
+    if profiler is not None:
+        profiler.init_app(app)
+    if app.config.get("START_DAEMON", True):
+        start_daemon(app.config, fragment_renderer, profiler)
 
     # 6 Register blueprints
     register_blueprints(app)
     Bootstrap(app)
+    AssetPipeline(app)
 
     return app
 
@@ -98,29 +121,74 @@ def register_blueprints(app):
     @param app: Flask app
     @type app: flask.Flask
     """
-    blueprints = {INDEX, DASHBOARD, COMMENT_SECTION}
+    blueprints = {INDEX, DASHBOARD, COMMENT_SECTION, FEED, METRICS}
 
     for blueprint in blueprints:
         app.register_blueprint(blueprint)
 
 
-def start_daemon(config):
+def start_daemon(config, fragment_renderer, profiler=None):
     """
     Start the daemon which looks for new stories on Hacker News in a regular
     interval.
 
     :@param config: Flask app config
     @type config: dict
+    @param fragment_renderer: Renderer for the stories' HTML fragments.
+    @type fragment_renderer: FragmentRenderer
+    @param profiler: Profiler for a sample of the refresh cycles or None.
+    @type profiler: Profiler or None
+    """
+    hn_daemon = create_daemon(config, fragment_renderer, profiler)
+    hn_daemon.run()
+    LOGGER.info(
+        "Started daemon with time interval {}.".format(hn_daemon.interval)
+    )
+
+
+def create_daemon(config, fragment_renderer, profiler=None):
+    """
+    Create the daemon which looks for new stories on Hacker News together with
+    the translation scheduler it hands new titles to. The scheduler is
+    started, the daemon isn't.
+
+    @param config: Flask app config
+    @type config: dict
+    @param fragment_renderer: Renderer for the stories' HTML fragments.
+    @type fragment_renderer: FragmentRenderer
+    @param profiler: Profiler for a sample of the refresh cycles or None.
+    @type profiler: Profiler or None
+    @return: Daemon
+    @rtype: HackerNewsDaemon
     """
     interval = config.get("REFRESH_INTERVAL", 600)
     target_language = config.get("TARGET_LANGUAGES", ("PT", ))
     source_language = config.get("SOURCE_LANGUAGE", "EN")
     story_collection = config.get("STORY_COLLECTION", "articles")
-    hn_daemon = HackerNewsDaemon(
+    comment_collection = config.get("COMMENT_COLLECTION", "comments")
+    poller = TranslationPoller(
+        config.get("TRANSLATION_POLL_MIN_INTERVAL", 5),
+        config.get("TRANSLATION_POLL_MAX_INTERVAL", 60),
+        config.get("TRANSLATION_POLL_BACKOFF", 1.5),
+        config.get("TRANSLATION_POLL_WORKERS", 8),
+        config.get("TRANSLATION_POLL_MAX_AGE", 86400)
+    )
+    scheduler = TranslationScheduler(
+        config.get("TRANSLATION_WORKERS", 4), poller
+    )
+    scheduler.start()
+    translation_memory = TranslationMemory(
+        config.get("TITLE_COLLECTION", "titles"),
+        config.get("TRANSLATION_MEMORY_CACHE_SIZE", 10000)
+    )
+    return HackerNewsDaemon(
         interval,
         source_language,
         target_language,
-        story_collection
+        story_collection,
+        comment_collection,
+        scheduler,
+        translation_memory,
+        fragment_renderer,
+        profiler
     )
-    hn_daemon.run()
-    LOGGER.info("Started daemon with time interval {}.".format(interval))
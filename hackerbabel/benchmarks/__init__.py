@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks running the pipeline against local stand-ins of its services.
+"""
@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local stand-ins for the services the pipeline depends on: An HTTP server
+imitating the Hacker News API with synthetic stories and comment trees, an
+HTTP server imitating the Unbabel API and a proxy counting the operations on a
+MongoDB database.
+"""
+
+# STD
+from collections import Counter
+from contextlib import contextmanager
+from copy import deepcopy
+import json
+from itertools import count, cycle
+import re
+from threading import Lock, Thread
+import time
+import uuid
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer  # Python 2
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+# PROJECT
+from hackerbabel.clients import mongodb_client
+from hackerbabel.clients.unbabel_client import IDEMPOTENCY_KEY_HEADER
+from hackerbabel.testing.fixtures import STORIES
+
+# CONST
+FIRST_ITEM_ID = 20000000
+FIRST_COMMENT_TIME = 1484650000
+ITEM_PATH = re.compile(r"^/v0/item/(\d+)\.json$")
+TRANSLATION_PATH = re.compile(r"^/tapi/v2/translation/([0-9a-f]+)/$")
+
+
+def synthetic_items(number_of_stories, width, depth):
+    """
+    Create Hacker News items for a number of stories, based on the stories in
+    hackerbabel.testing.fixtures. Every story gets a full comment tree: Each
+    comment has the same number of replies up to a maximum depth.
+
+    @param number_of_stories: Number of top stories.
+    @type number_of_stories: int
+    @param width: Number of top level comments per story and replies per
+    comment.
+    @type width: int
+    @param depth: Number of comment levels.
+    @type depth: int
+    @return: IDs of the top stories and all items by ID.
+    @rtype: tuple
+    """
+    item_ids = count(FIRST_ITEM_ID)
+    items = {}
+    top_story_ids = []
+
+    for _, fixture in zip(range(number_of_stories), cycle(STORIES)):
+        story = deepcopy(fixture)
+        story["id"] = next(item_ids)
+        story["kids"] = []
+        items[story["id"]] = story
+        top_story_ids.append(story["id"])
+
+        level = [story]
+        for _ in range(depth):
+            next_level = []
+
+            for parent in level:
+                for rank in range(width):
+                    comment_id = next(item_ids)
+                    parent["kids"].append(comment_id)
+                    comment = {
+                        "id": comment_id,
+                        "type": "comment",
+                        "parent": parent["id"],
+                        "by": "user{}".format(comment_id % 1000),
+                        "time": FIRST_COMMENT_TIME + comment_id % 10000,
+                        "text": "Synthetic reply {} to {}.".format(
+                            rank, parent["id"]
+                        ),
+                        "kids": []
+                    }
+                    items[comment_id] = comment
+                    next_level.append(comment)
+
+            level = next_level
+
+        story["descendants"] = sum(
+            width ** comment_depth for comment_depth in range(1, depth + 1)
+        )
+
+    return top_story_ids, items
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeServer(object):
+    """
+    HTTP server running in its own thread on a free local port. Every request
+    is delayed by a fixed latency and counted.
+    """
+    def __init__(self, latency=0):
+        """
+        Initializer.
+
+        @param latency: Time in seconds every request is delayed.
+        @type latency: float
+        """
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = Lock()
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """
+        Start serving requests.
+        """
+        fake_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep connections alive
+            wbufsize = -1  # Send headers and body at once
+
+            def do_GET(self):
+                fake_server._respond(self, "GET")
+
+            def do_POST(self):
+                fake_server._respond(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def address(self):
+        """
+        Return the base address of the server.
+
+        @return: Address, e.g. "http://127.0.0.1:12345"
+        @rtype: str
+        """
+        return "http://{}:{}".format(*self.server.server_address[:2])
+
+    def reset_statistics(self):
+        """
+        Reset the request counters.
+        """
+        with self.lock:
+            self.requests.clear()
+
+    def statistics(self):
+        """
+        Return the request counters.
+
+        @return: Number of requests by type of request.
+        @rtype: dict
+        """
+        with self.lock:
+            return dict(self.requests)
+
+    def handle(self, method, path, body, headers):
+        """
+        Answer a request.
+
+        @param method: HTTP method, "GET" or "POST".
+        @type method: str
+        @param path: Requested path.
+        @type path: str
+        @param body: Decoded JSON body or None.
+        @type body: dict or None
+        @param headers: Request headers.
+        @type headers: dict-like
+        @return: Type of request (for the counters), status code and data
+        sent as JSON.
+        @rtype: tuple
+        """
+        raise NotImplementedError
+
+    def _respond(self, handler, method):
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else None
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        request_type, status, data = self.handle(
+            method, handler.path, json.loads(body) if body else None,
+            handler.headers
+        )
+        with self.lock:
+            self.requests[request_type] += 1
+
+        content = json.dumps(data).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+
+class FakeHackerNewsServer(FakeServer):
+    """
+    Server imitating the Hacker News API (top stories and items).
+    """
+    def __init__(self, top_story_ids, items, latency=0):
+        """
+        Initializer.
+
+        @param top_story_ids: IDs of the top stories.
+        @type top_story_ids: list
+        @param items: Items by ID, see synthetic_items().
+        @type items: dict
+        @param latency: Time in seconds every request is delayed.
+        @type latency: float
+        """
+        super(FakeHackerNewsServer, self).__init__(latency)
+        self.top_story_ids = top_story_ids
+        self.items = items
+
+    @property
+    def api_uri(self):
+        """
+        Return the URI to use as HN_API_URI.
+
+        @return: URI
+        @rtype: str
+        """
+        return self.address + "/v0/"
+
+    def handle(self, method, path, body, headers):
+        if path == "/v0/topstories.json":
+            return "topstories", 200, self.top_story_ids
+
+        match = ITEM_PATH.match(path)
+        if match:
+            item = self.items.get(int(match.group(1)))
+            return item.get("type", "story") if item else "missing", 200, item
+
+        return "unknown", 404, None
+
+    def check_items_served(self):
+        """
+        Make sure the stories and, if there are any, the comments were
+        requested from this server since its statistics were reset, instead
+        of e.g. the real Hacker News API.
+
+        @raise RuntimeError: If no story or no comment was requested.
+        """
+        statistics = self.statistics()
+        expected = {"story"} if self.top_story_ids else set()
+        if any(item.get("type") == "comment" for item in self.items.values()):
+            expected.add("comment")
+        missing = sorted(
+            request_type for request_type in expected
+            if not statistics.get(request_type)
+        )
+
+        if missing:
+            raise RuntimeError(
+                "No {} items were requested from the fake Hacker News API, "
+                "the client fetched them elsewhere (requests: {}).".format(
+                    " or ".join(missing), statistics
+                )
+            )
+
+
+class FakeUnbabelServer(FakeServer):
+    """
+    Server imitating the Unbabel translation API. Jobs are completed a fixed
+    time after they were submitted, their translation is the original text
+    prefixed with the target language. Submissions with the idempotency key
+    of an earlier one return the job created first.
+    """
+    def __init__(self, latency=0, turnaround=0):
+        """
+        Initializer.
+
+        @param latency: Time in seconds every request is delayed.
+        @type latency: float
+        @param turnaround: Time in seconds until a submitted job is completed.
+        @type turnaround: float
+        """
+        super(FakeUnbabelServer, self).__init__(latency)
+        self.turnaround = turnaround
+        self.jobs = {}
+        self.idempotency_keys = {}
+
+    @property
+    def api_uri(self):
+        """
+        Return the URI to use as UNBABEL_API_URI.
+
+        @return: URI
+        @rtype: str
+        """
+        return self.address + "/tapi/v2/translation/"
+
+    def handle(self, method, path, body, headers):
+        if method == "POST" and path == "/tapi/v2/translation/":
+            key = headers.get(IDEMPOTENCY_KEY_HEADER)
+            with self.lock:
+                uid = self.idempotency_keys.get(key) if key else None
+                if uid is None:
+                    uid = uuid.uuid4().hex
+                    self.jobs[uid] = (body, time.time())
+                    if key:
+                        self.idempotency_keys[key] = uid
+            return "submit", 201, {
+                "uid": uid, "status": "new", "text": body["text"],
+                "target_language": body["target_language"]
+            }
+
+        match = TRANSLATION_PATH.match(path)
+        with self.lock:
+            job = self.jobs.get(match.group(1)) if match else None
+        if job is None:
+            return "unknown", 404, None
+
+        data, submitted = job
+        if time.time() < submitted + self.turnaround:
+            return "status", 200, {
+                "uid": match.group(1), "status": "translating"
+            }
+
+        return "status", 200, {
+            "uid": match.group(1), "status": "completed",
+            "translatedText": u"[{}] {}".format(
+                data["target_language"].upper(), data["text"]
+            )
+        }
+
+
+@contextmanager
+def in_memory_mongodb():
+    """
+    Let the MongoDBClient connect to an in-memory database (mongomock) instead
+    of MongoDB while it's initialized inside this context.
+    """
+    import mongomock  # Only needed for benchmarks
+
+    mongo_client = mongodb_client.MongoClient
+    mongodb_client.MongoClient = mongomock.MongoClient
+    try:
+        yield
+    finally:
+        mongodb_client.MongoClient = mongo_client
+
+
+class CountingDatabase(object):
+    """
+    Proxy around a pymongo database counting the operations on its
+    collections by method, as well as the documents written by bulk writes
+    per collection.
+    """
+    def __init__(self, db):
+        """
+        Initializer.
+
+        @param db: Database.
+        @type db: pymongo.database.Database
+        """
+        self.db = db
+        self.operations = Counter()
+        self.written = Counter()
+        self.lock = Lock()
+
+    def __getattr__(self, name):
+        return CountingCollection(getattr(self.db, name), self)
+
+    def __getitem__(self, name):
+        return CountingCollection(self.db[name], self)
+
+    def count_operation(self, method):
+        """
+        Count a call of a collection method.
+
+        @param method: Name of the method.
+        @type method: str
+        """
+        with self.lock:
+            self.operations[method] += 1
+
+    def count_written(self, collection_name, number):
+        """
+        Count documents written to a collection.
+
+        @param collection_name: Name of the collection.
+        @type collection_name: str
+        @param number: Number of documents.
+        @type number: int
+        """
+        with self.lock:
+            self.written[collection_name] += number
+
+    def reset_statistics(self):
+        """
+        Reset the operation and document counters.
+        """
+        with self.lock:
+            self.operations.clear()
+            self.written.clear()
+
+    def statistics(self):
+        """
+        Return the operation counters.
+
+        @return: Number of operations by collection method.
+        @rtype: dict
+        """
+        with self.lock:
+            return dict(self.operations)
+
+    def documents_written(self):
+        """
+        Return the number of documents inserted or replaced by bulk writes.
+
+        @return: Number of documents by collection name.
+        @rtype: dict
+        """
+        with self.lock:
+            return dict(self.written)
+
+
+class CountingCollection(object):
+    """
+    Proxy around a pymongo collection counting calls of its methods.
+    """
+    def __init__(self, collection, counting_db):
+        self.collection = collection
+        self.counting_db = counting_db
+
+    def __getattr__(self, name):
+        attribute = getattr(self.collection, name)
+
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.counting_db.count_operation(name)
+            result = attribute(*args, **kwargs)
+
+            if name == "bulk_write":
+                self.counting_db.count_written(
+                    self.collection.name,
+                    result.inserted_count + result.upserted_count +
+                    result.matched_count
+                )
+
+            return result
+
+        return counted
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+
+"""
+Load test of the pages served by the app built by setup_app(). The database is
+seeded by one refresh cycle against the fake Hacker News API (see
+fake_services), afterwards every page is requested concurrently.
+
+Every page is tested twice: With the page cache disabled, so every request
+renders the page (cache miss), and with an in-memory page cache that was
+filled before the measurement (cache hit).
+
+Results are written as JSON, so runs on different commits can be compared:
+
+    $ python -m hackerbabel.benchmarks.load_benchmark --concurrency 8 \\
+        --requests 500 --output results.json
+"""
+
+# STD
+import argparse
+import datetime
+from itertools import count
+import json
+import logging
+import math
+import platform
+import sys
+from threading import Lock, Thread
+import time
+
+# EXT
+import requests
+from werkzeug.serving import make_server
+
+# PROJECT
+from hackerbabel import create_daemon, setup_app
+from hackerbabel.benchmarks.fake_services import (
+    CountingDatabase, FakeHackerNewsServer, FakeUnbabelServer,
+    in_memory_mongodb, synthetic_items
+)
+from hackerbabel.benchmarks.pipeline_benchmark import (
+    BENCHMARK_CONFIG, git_commit, parse_overrides, wait_for_translations
+)
+from hackerbabel.cache import cache
+from hackerbabel.clients.mongodb_client import MongoDBClient
+
+# CONST
+# Page cache backend of every scenario
+SCENARIOS = (("cache_miss", "null"), ("cache_hit", "simple"))
+PERCENTILES = (50, 95, 99)
+
+
+def parse_arguments(arguments=None):
+    """
+    Parse the command line arguments of the benchmark.
+
+    @param arguments: Arguments, sys.argv[1:] if None.
+    @type arguments: list or None
+    @return: Parsed arguments.
+    @rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--stories", type=int, default=30, help="Number of stories."
+    )
+    parser.add_argument(
+        "--width", type=int, default=10,
+        help="Top level comments per story and replies per comment."
+    )
+    parser.add_argument(
+        "--depth", type=int, default=3, help="Levels of comments per story."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8,
+        help="Number of concurrent clients."
+    )
+    parser.add_argument(
+        "--requests", type=int, default=500,
+        help="Number of requests per page."
+    )
+    parser.add_argument(
+        "--mongodb", action="store_true",
+        help="Use the local MongoDB from the config instead of mongomock."
+    )
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="KEY=VALUE",
+        help="Override a config entry, e.g. COMMENTS_PER_PAGE=50."
+    )
+    parser.add_argument(
+        "--output", help="File the results are written to, default: stdout."
+    )
+    return parser.parse_args(arguments)
+
+
+def build_app(config_overrides, use_mongodb):
+    """
+    Create the app with an empty database and without the daemon.
+
+    @param config_overrides: Config entries replacing those of the config
+    file.
+    @type config_overrides: dict
+    @param use_mongodb: Use the local MongoDB instead of mongomock.
+    @type use_mongodb: bool
+    @return: App and the proxy of its database.
+    @rtype: tuple
+    """
+    if use_mongodb:
+        app = setup_app(config_overrides)
+        MongoDBClient.client.drop_database(app.config["MONGODB_NAME"])
+        MongoDBClient.initialize(**app.config)  # Create the indexes again
+    else:
+        with in_memory_mongodb():
+            app = setup_app(config_overrides)
+
+    MongoDBClient.db = CountingDatabase(MongoDBClient.db)
+    return app, MongoDBClient.db
+
+
+def seed_database(app, db, hn_server):
+    """
+    Store the stories of the fake Hacker News API and wait for their
+    translations.
+
+    @param app: App
+    @type app: flask.Flask
+    @param db: Proxy of the database.
+    @type db: CountingDatabase
+    @param hn_server: Fake Hacker News API.
+    @type hn_server: FakeHackerNewsServer
+    """
+    hn_daemon = create_daemon(app.config, app.extensions["fragments"])
+    hn_server.reset_statistics()
+    hn_daemon.refresh_cycle()
+    hn_server.check_items_served()
+    wait_for_translations(db, app.config, 120)
+
+
+def percentile(values, percent):
+    """
+    Return a percentile of some values (nearest rank).
+
+    @param values: Values
+    @type values: list
+    @param percent: Percentile between 0 and 100.
+    @type percent: float
+    @return: Percentile
+    @rtype: float
+    """
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+    return ordered[max(rank - 1, 0)]
+
+
+def drive(base_url, paths, number_of_requests, concurrency):
+    """
+    Request some paths in turns with concurrent clients.
+
+    @param base_url: Address of the app.
+    @type base_url: str
+    @param paths: Paths requested in turns.
+    @type paths: list
+    @param number_of_requests: Total number of requests.
+    @type number_of_requests: int
+    @param concurrency: Number of concurrent clients.
+    @type concurrency: int
+    @return: Latency in seconds, status code and size in bytes of every
+    request and the duration of all requests.
+    @rtype: tuple
+    """
+    request_numbers = count()
+    lock = Lock()
+    samples = []
+
+    def client():
+        session = requests.Session()
+
+        while True:
+            with lock:
+                number = next(request_numbers)
+            if number >= number_of_requests:
+                return
+
+            start_time = time.time()
+            response = session.get(base_url + paths[number % len(paths)])
+            latency = time.time() - start_time
+
+            # Size of the response body as sent, i.e. compressed
+            size = int(
+                response.headers.get("Content-Length", len(response.content))
+            )
+            with lock:
+                samples.append((latency, response.status_code, size))
+
+    clients = [Thread(target=client) for _ in range(concurrency)]
+    start_time = time.time()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+
+    return samples, time.time() - start_time
+
+
+def measure_page(base_url, paths, options, db):
+    """
+    Load test one page.
+
+    @param base_url: Address of the app.
+    @type base_url: str
+    @param paths: Paths of the page, e.g. of every comment section.
+    @type paths: list
+    @param options: Parsed command line arguments.
+    @type options: argparse.Namespace
+    @param db: Proxy of the database.
+    @type db: CountingDatabase
+    @return: Results of the page.
+    @rtype: dict
+    """
+    # Fill the cache, compile templates etc.
+    drive(base_url, paths, len(paths), 1)
+
+    db.reset_statistics()
+    cache_before = cache.statistics()
+    samples, duration = drive(
+        base_url, paths, options.requests, options.concurrency
+    )
+    cache_after = cache.statistics()
+
+    latencies = [sample[0] * 1000 for sample in samples]
+    hits = cache_after["hits"] - cache_before["hits"]
+    lookups = hits + cache_after["misses"] - cache_before["misses"]
+
+    results = {
+        "requests": len(samples),
+        "errors": len([sample for sample in samples if sample[1] >= 400]),
+        "throughput": len(samples) / duration,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies),
+            "max": max(latencies)
+        },
+        "response_bytes": sum(sample[2] for sample in samples) // len(samples),
+        "mongo_operations_per_request":
+            sum(db.statistics().values()) / float(len(samples)),
+        "cache_hit_ratio": hits / float(lookups) if lookups else 0.0
+    }
+    for percent in PERCENTILES:
+        results["latency_ms"]["p{}".format(percent)] = percentile(
+            latencies, percent
+        )
+
+    return results
+
+
+def run_scenario(cache_type, config_overrides, hn_server, options):
+    """
+    Load test all pages with one page cache backend.
+
+    @param cache_type: Page cache backend, see CACHE_TYPE in the config.
+    @type cache_type: str
+    @param config_overrides: Config entries replacing those of the config
+    file.
+    @type config_overrides: dict
+    @param hn_server: Fake Hacker News API the stories are taken from.
+    @type hn_server: FakeHackerNewsServer
+    @param options: Parsed command line arguments.
+    @type options: argparse.Namespace
+    @return: Results by page.
+    @rtype: dict
+    """
+    app, db = build_app(
+        dict(config_overrides, CACHE_TYPE=cache_type), options.mongodb
+    )
+    seed_database(app, db, hn_server)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    base_url = "http://127.0.0.1:{}".format(server.server_port)
+
+    pages = {
+        "index": ["/"],
+        "dashboard": ["/dashboard"],
+        "comments": [
+            "/{}/comments".format(story_id)
+            for story_id in hn_server.top_story_ids
+        ]
+    }
+
+    try:
+        return {
+            page: measure_page(base_url, paths, options, db)
+            for page, paths in pages.items()
+        }
+    finally:
+        server.shutdown()
+
+
+def run_benchmark(options):
+    """
+    Run the benchmark.
+
+    @param options: Parsed command line arguments.
+    @type options: argparse.Namespace
+    @return: Results
+    @rtype: dict
+    """
+    story_ids, items = synthetic_items(
+        options.stories, options.width, options.depth
+    )
+    hn_server = FakeHackerNewsServer(story_ids, items)
+    unbabel_server = FakeUnbabelServer()
+    hn_server.start()
+    unbabel_server.start()
+
+    config_overrides = dict(BENCHMARK_CONFIG)
+    config_overrides.update({
+        "DEBUG": False,
+        "START_DAEMON": False,
+        "CONSOLE_LOGGING": False,
+        "LOGGER_LOGLEVEL": "WARNING",
+        "NUMBER_OF_STORIES": options.stories,
+        "HN_API_URI": hn_server.api_uri,
+        "UNBABEL_API_URI": unbabel_server.api_uri
+    })
+    config_overrides.update(parse_overrides(options.set))
+
+    try:
+        scenarios = {
+            scenario: run_scenario(
+                cache_type, config_overrides, hn_server, options
+            )
+            for scenario, cache_type in SCENARIOS
+        }
+    finally:
+        hn_server.stop()
+        unbabel_server.stop()
+
+    return {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "date": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "parameters": {
+            "stories": options.stories,
+            "width": options.width,
+            "depth": options.depth,
+            "comments_per_story":
+                (len(items) - len(story_ids)) // max(len(story_ids), 1),
+            "concurrency": options.concurrency,
+            "requests": options.requests,
+            "database": "mongodb" if options.mongodb else "mongomock",
+            "overrides": options.set
+        },
+        "scenarios": scenarios
+    }
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+    logging.basicConfig(level=logging.WARNING)
+
+    results = json.dumps(run_benchmark(options), indent=2, sort_keys=True)
+
+    if options.output:
+        with open(options.output, "w") as output_file:
+            output_file.write(results + "\n")
+    else:
+        sys.stdout.write(results + "\n")
+
+
+if __name__ == "__main__":
+    main()
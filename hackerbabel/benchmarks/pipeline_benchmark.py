@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the ingest / translate pipeline without any external service:
+Hacker News and Unbabel are replaced by local fake servers, MongoDB by an
+in-memory database (mongomock) unless a local MongoDB is requested.
+
+The first refresh cycle finds only new stories (cold), the following ones
+find the stories stored already (warm). Between them, the translations of all
+new titles are awaited to measure their turnaround.
+
+Results are written as JSON, so runs on different commits can be compared:
+
+    $ python -m hackerbabel.benchmarks.pipeline_benchmark --stories 30 \\
+        --width 5 --depth 3 --output results.json
+"""
+
+# STD
+import argparse
+import ast
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# EXT
+from flask import Flask
+
+# PROJECT
+from hackerbabel import create_daemon
+from hackerbabel.benchmarks.fake_services import (
+    CountingDatabase, FakeHackerNewsServer, FakeUnbabelServer,
+    in_memory_mongodb, synthetic_items
+)
+from hackerbabel.cache import cache
+from hackerbabel.clients.hackernews_client import HackerNewsClient
+from hackerbabel.clients.mongodb_client import MongoDBClient
+from hackerbabel.clients.unbabel_client import UnbabelClient
+from hackerbabel.src.fragments import FragmentRenderer
+from hackerbabel.src.helpers import get_config_from_py_file
+
+# CONST
+PACKAGE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CONFIG_PATH = os.path.join(PACKAGE_DIR, "config.py")
+# Overrides of the app's config, so benchmark runs don't depend on earlier ones
+BENCHMARK_CONFIG = {
+    "MONGODB_NAME": "hackerbabel_benchmark",
+    "HN_ITEM_STORE_PATH": None,
+    "CACHE_TYPE": "simple",
+    "TRANSLATION_POLL_MIN_INTERVAL": 0.1,
+    "TRANSLATION_POLL_MAX_INTERVAL": 1,
+    "UNBABEL_RETRY_BASE_DELAY": 0.1
+}
+
+
+def parse_arguments(arguments=None):
+    """
+    Parse the command line arguments of the benchmark.
+
+    @param arguments: Arguments, sys.argv[1:] if None.
+    @type arguments: list or None
+    @return: Parsed arguments.
+    @rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--stories", type=int, default=30, help="Number of top stories."
+    )
+    parser.add_argument(
+        "--width", type=int, default=5,
+        help="Top level comments per story and replies per comment."
+    )
+    parser.add_argument(
+        "--depth", type=int, default=3, help="Levels of comments per story."
+    )
+    parser.add_argument(
+        "--cycles", type=int, default=3,
+        help="Refresh cycles, the first one is cold."
+    )
+    parser.add_argument(
+        "--hn-latency", type=float, default=0.01,
+        help="Seconds every request to Hacker News takes."
+    )
+    parser.add_argument(
+        "--unbabel-latency", type=float, default=0.05,
+        help="Seconds every request to Unbabel takes."
+    )
+    parser.add_argument(
+        "--unbabel-turnaround", type=float, default=1,
+        help="Seconds until Unbabel completes a translation job."
+    )
+    parser.add_argument(
+        "--translation-timeout", type=float, default=120,
+        help="Seconds to wait for all translations."
+    )
+    parser.add_argument(
+        "--mongodb", action="store_true",
+        help="Use the local MongoDB from the config instead of mongomock."
+    )
+    parser.add_argument(
+        "--set", action="append", default=[], metavar="KEY=VALUE",
+        help="Override a config entry, e.g. HN_FETCH_WORKERS=16."
+    )
+    parser.add_argument(
+        "--output", help="File the results are written to, default: stdout."
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the pipeline's logs."
+    )
+    return parser.parse_args(arguments)
+
+
+def parse_overrides(overrides):
+    """
+    Parse config entries given on the command line. Values are read as
+    Python literals if possible, as strings otherwise.
+
+    @param overrides: Config entries as "KEY=VALUE".
+    @type overrides: list
+    @return: Config entries.
+    @rtype: dict
+    """
+    config = {}
+
+    for override in overrides:
+        key, value = override.split("=", 1)
+        try:
+            config[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            config[key] = value
+
+    return config
+
+
+def build_config(options, hn_server, unbabel_server):
+    """
+    Create the config of a benchmark run from the app's config.
+
+    @param options: Parsed command line arguments.
+    @type options: argparse.Namespace
+    @param hn_server: Fake Hacker News API.
+    @type hn_server: FakeHackerNewsServer
+    @param unbabel_server: Fake Unbabel API.
+    @type unbabel_server: FakeUnbabelServer
+    @return: Config
+    @rtype: dict
+    """
+    config = get_config_from_py_file(CONFIG_PATH)
+    config.update(BENCHMARK_CONFIG)
+    config.update(parse_overrides(options.set))
+    config.update({
+        "NUMBER_OF_STORIES": options.stories,
+        "HN_API_URI": hn_server.api_uri,
+        "UNBABEL_API_URI": unbabel_server.api_uri
+    })
+    return config
+
+
+def init_clients(config, use_mongodb):
+    """
+    Initialize the clients with the benchmark's config. The database is
+    wrapped into a proxy counting its operations.
+
+    @param config: Config
+    @type config: dict
+    @param use_mongodb: Use the local MongoDB instead of mongomock.
+    @type use_mongodb: bool
+    @return: Proxy of the database.
+    @rtype: CountingDatabase
+    """
+    HackerNewsClient.initialize(**config)
+    UnbabelClient.initialize(**config)
+
+    if use_mongodb:
+        MongoDBClient.initialize(**config)
+        MongoDBClient.client.drop_database(config["MONGODB_NAME"])
+        MongoDBClient.initialize(**config)  # Create the indexes again
+    else:
+        with in_memory_mongodb():
+            MongoDBClient.initialize(**config)
+
+    MongoDBClient.db = CountingDatabase(MongoDBClient.db)
+    return MongoDBClient.db
+
+
+def wait_for_translations(db, config, timeout):
+    """
+    Wait until the translations of all stored titles are done or failed.
+
+    @param db: Proxy of the database.
+    @type db: CountingDatabase
+    @param config: Config
+    @type config: dict
+    @param timeout: Maximum time to wait in seconds.
+    @type timeout: float
+    @return: Number of completed and failed translations, None if they
+    didn't finish in time.
+    @rtype: tuple or None
+    """
+    # Query the database directly, so the queries aren't counted
+    collection = getattr(db.db, config["STORY_COLLECTION"])
+    langs = config["TARGET_LANGUAGES"]
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        statuses = [
+            story["titles"][lang].get("translation_status")
+            for story in collection.find({}, {"titles": 1})
+            for lang in langs
+        ]
+
+        if all(status in ("done", "failed") for status in statuses):
+            return statuses.count("done"), statuses.count("failed")
+
+        time.sleep(0.05)
+
+    return None
+
+
+def run_cycle(hn_daemon, db, hn_server, number):
+    """
+    Run one refresh cycle of the daemon and measure it. Stories and comments
+    are counted as they are written to the database, comments are only
+    written if their story got new ones.
+
+    @param hn_daemon: Daemon
+    @type hn_daemon: HackerNewsDaemon
+    @param db: Proxy of the database.
+    @type db: CountingDatabase
+    @param hn_server: Fake Hacker News API.
+    @type hn_server: FakeHackerNewsServer
+    @param number: Number of the cycle, starting at 1.
+    @type number: int
+    @return: Results of the cycle.
+    @rtype: dict
+    @raise RuntimeError: If the cycle stored no stories.
+    """
+    db.reset_statistics()
+    hn_server.reset_statistics()
+
+    start_time = time.time()
+    hn_daemon.refresh_cycle()
+    duration = time.time() - start_time
+
+    written = db.documents_written()
+    stories = written.get(hn_daemon.story_collection, 0)
+    comments = written.get(hn_daemon.comment_collection, 0)
+    operations = db.statistics()
+
+    if not stories:
+        raise RuntimeError(
+            "Cycle {} stored no stories (requests: {}).".format(
+                number, hn_server.statistics()
+            )
+        )
+
+    return {
+        "cycle": number,
+        "cold": number == 1,
+        "duration": duration,
+        "stories": stories,
+        "comments": comments,
+        "stories_per_second": stories / duration,
+        "comments_per_second": comments / duration,
+        "mongo_operations": sum(operations.values()),
+        "mongo_operations_by_method": operations,
+        "hn_requests": hn_server.statistics()
+    }
+
+
+def git_commit():
+    """
+    Return the commit the benchmark runs on.
+
+    @return: Commit hash or None if unknown.
+    @rtype: str or None
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=PACKAGE_DIR
+        ).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(options):
+    """
+    Run the benchmark.
+
+    @param options: Parsed command line arguments.
+    @type options: argparse.Namespace
+    @return: Results
+    @rtype: dict
+    """
+    top_story_ids, items = synthetic_items(
+        options.stories, options.width, options.depth
+    )
+    comments_per_story = (len(items) - len(top_story_ids)) // \
+        max(len(top_story_ids), 1)
+    hn_server = FakeHackerNewsServer(top_story_ids, items, options.hn_latency)
+    unbabel_server = FakeUnbabelServer(
+        options.unbabel_latency, options.unbabel_turnaround
+    )
+    hn_server.start()
+    unbabel_server.start()
+
+    try:
+        config = build_config(options, hn_server, unbabel_server)
+
+        # Pages are invalidated by the daemon, so the cache needs an app
+        app = Flask(
+            import_name="hackerbabel", template_folder="templates",
+            root_path=PACKAGE_DIR
+        )
+        app.config.update(config)
+        cache.init_app(app)
+        cache.app = app
+
+        db = init_clients(config, options.mongodb)
+        hn_daemon = create_daemon(config, FragmentRenderer(
+            app.jinja_env, config.get("SOURCE_LANGUAGE", "EN"),
+            config.get("COMMENTS_PER_PAGE", 20)
+        ))
+
+        cycles = [run_cycle(hn_daemon, db, hn_server, 1)]
+        # Results are meaningless if the items came from the network
+        hn_server.check_items_served()
+
+        start_time = time.time()
+        translations = wait_for_translations(
+            db, config, options.translation_timeout
+        )
+        turnaround = time.time() - start_time
+
+        for number in range(2, options.cycles + 1):
+            cycles.append(run_cycle(hn_daemon, db, hn_server, number))
+    finally:
+        hn_server.stop()
+        unbabel_server.stop()
+
+    return {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "date": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "parameters": {
+            "stories": options.stories,
+            "width": options.width,
+            "depth": options.depth,
+            "comments_per_story": comments_per_story,
+            "hn_latency": options.hn_latency,
+            "unbabel_latency": options.unbabel_latency,
+            "unbabel_turnaround": options.unbabel_turnaround,
+            "database": "mongodb" if options.mongodb else "mongomock",
+            "overrides": options.set
+        },
+        "cycles": cycles,
+        "translation": {
+            "finished": translations is not None,
+            "turnaround": turnaround,
+            "done": translations[0] if translations else None,
+            "failed": translations[1] if translations else None,
+            "unbabel_requests": unbabel_server.statistics()
+        }
+    }
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+    logging.basicConfig(
+        level=logging.INFO if options.verbose else logging.WARNING
+    )
+
+    results = json.dumps(run_benchmark(options), indent=2, sort_keys=True)
+
+    if options.output:
+        with open(options.output, "w") as output_file:
+            output_file.write(results + "\n")
+    else:
+        sys.stdout.write(results + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,190 @@
+# -*- coding: utf-8 -*-
 
+"""
+Cache for rendered pages. Pages are cached until the data they show changes,
+so the daemons writing the data invalidate them.
+
+The backend is chosen with CACHE_TYPE in the config: "simple" keeps pages in
+the memory of each process (fine for a single process and tests),
+"filesystem" shares them between the processes on one machine through
+CACHE_DIR, "redis" and "memcached" share them between machines. "null"
+disables caching.
+"""
+
+# STD
+from threading import Lock
+
+# EXT
+from flask import request
 from flask_cache import Cache
-cache = Cache(config={'CACHE_TYPE': 'simple'})
+
+# PROJECT
+from hackerbabel.src.metrics import lookups_by_result, registry
+
+# CONST
+INDEX_KEY = "view/index"
+DASHBOARD_KEY = "view/dashboard"
+FEED_KEY = "view/feed"
+COMMENT_SECTION_KEY = "view/comments/{story_id}"
+
+
+class CacheStatistics(object):
+    """
+    Wrapper around a cache backend counting hits and misses of the current
+    process.
+    """
+    def __init__(self, backend):
+        """
+        Initializer.
+
+        @param backend: Cache backend.
+        @type backend: werkzeug.contrib.cache.BaseCache
+        """
+        self.backend = backend
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+
+    def get(self, key):
+        """
+        Look up a value in the backend, counting it as a hit or a miss.
+
+        @param key: Cache key.
+        @type key: str
+        @return: Cached value or None.
+        @rtype: object or None
+        """
+        value = self.backend.get(key)
+
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return value
+
+    def set(self, *args, **kwargs):
+        """
+        Store a value in the backend and count it, see BaseCache.set().
+
+        @return: Whether the value was stored.
+        @rtype: bool
+        """
+        with self.lock:
+            self.sets += 1
+        return self.backend.set(*args, **kwargs)
+
+    def delete_many(self, *keys):
+        """
+        Remove values from the backend, counting every key as a delete even if
+        nothing was cached under it.
+
+        @param keys: Cache keys.
+        @type keys: tuple
+        @return: Whether the values were removed.
+        @rtype: bool
+        """
+        with self.lock:
+            self.deletes += len(keys)
+        return self.backend.delete_many(*keys)
+
+    def statistics(self):
+        """
+        Return the counters.
+
+        @return: Backend, hits, misses, sets, deletes and hit ratio.
+        @rtype: dict
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "deletes": self.deletes,
+                "hit_ratio": self.hits / float(lookups) if lookups else 0.0
+            }
+
+    def __getattr__(self, name):
+        # Everything else, e.g. clear(), is passed on to the backend uncounted
+        return getattr(self.backend, name)
+
+
+class PageCache(Cache):
+    """
+    Flask-Cache extension whose backend keeps statistics.
+    """
+    def init_app(self, app, config=None):
+        """
+        Set up the backend for an app and wrap it in a CacheStatistics.
+
+        @param app: Flask app.
+        @type app: flask.Flask
+        @param config: Config overriding the one of the app.
+        @type config: dict or None
+        """
+        super(PageCache, self).init_app(app, config)
+        app.extensions["cache"][self] = CacheStatistics(
+            app.extensions["cache"][self]
+        )
+
+    def statistics(self):
+        """
+        Return the cache's counters.
+
+        @return: Backend, hits, misses, sets, deletes and hit ratio.
+        @rtype: dict
+        """
+        return self.cache.statistics()
+
+
+cache = PageCache()
+
+
+def comment_section_key():
+    """
+    Create the cache key of the comment section currently requested.
+
+    @return: Cache key
+    @rtype: str
+    """
+    return COMMENT_SECTION_KEY.format(story_id=request.view_args["story_id"])
+
+
+def version_key(page_key):
+    """
+    Create the cache key of a page's content version.
+
+    @param page_key: Cache key of the page.
+    @type page_key: str
+    @return: Cache key
+    @rtype: str
+    """
+    return "version/" + page_key
+
+
+def invalidate_story_pages(story_ids=()):
+    """
+    Remove the cached pages listing the stories (index, dashboard and feed) and
+    the comment sections of some stories, together with their versions.
+
+    @param story_ids: IDs of stories whose comment sections changed.
+    @type story_ids: list or tuple
+    """
+    page_keys = [INDEX_KEY, DASHBOARD_KEY, FEED_KEY] + [
+        COMMENT_SECTION_KEY.format(story_id=story_id) for story_id in story_ids
+    ]
+    cache.delete_many(
+        *(page_keys + [version_key(page_key) for page_key in page_keys])
+    )
+
+
+registry.counter(
+    "hackerbabel_page_cache_lookups_total",
+    "Lookups in the page cache of this process, by result.",
+    labels=("result", ), function=lookups_by_result(lambda: cache)
+)
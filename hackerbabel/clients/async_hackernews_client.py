@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio backend used by the HackerNewsClient to fetch stories and their
+comments on a single event loop (requires Python 3.5+ and aiohttp).
+"""
+
+# STD
+import asyncio
+import logging
+import time
+
+# EXT
+import aiohttp
+
+# PROJECT
+from hackerbabel.clients.hackernews_client import (
+    HackerNewsClient, HN_ITEMS, HN_REQUEST_SECONDS
+)
+
+# CONST
+LOGGER = logging.getLogger()
+
+
+class AsyncHackerNewsBackend(object):
+    """
+    Fetches the top stories of Hacker News and their whole comment trees
+    concurrently. The number of requests in flight is limited by a semaphore
+    and the connection pool of one shared session.
+    """
+    def __init__(self, api_uri, connections=100, timeout=30):
+        """
+        Initializer.
+
+        @param api_uri: Base URI of the Hacker News API.
+        @type api_uri: str or unicode
+        @param connections: Maximum number of concurrent requests.
+        @type connections: int
+        @param timeout: Timeout for a single request in seconds.
+        @type timeout: int
+        """
+        self.api_uri = api_uri
+        self.connections = connections
+        self.timeout = timeout
+
+    def get_top_stories(self, limit):
+        """
+        Return the top stories of Hacker News with resolved comments.
+
+        @param limit: Number of stories.
+        @type limit: int
+        @return: Stories as dictionaries, with the comment tree under "kids"
+        in the same format as produced by
+        HackerNewsClient.resolve_comment_ids().
+        @rtype: list
+        """
+        loop = asyncio.new_event_loop()
+
+        try:
+            return loop.run_until_complete(self._get_top_stories(limit))
+        finally:
+            loop.close()
+
+    async def _get_top_stories(self, limit):
+        """
+        Coroutine fetching the top stories.
+
+        @param limit: Number of stories.
+        @type limit: int
+        @return: Stories with resolved comments.
+        @rtype: list
+        """
+        semaphore = asyncio.Semaphore(self.connections)
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(
+                connector=connector, timeout=timeout) as session:
+            story_ids = await self._fetch_json(
+                session, semaphore, "topstories.json"
+            )
+            stories = await asyncio.gather(*[
+                self._fetch_story(session, semaphore, story_id)
+                for story_id in (story_ids or [])[:limit]
+            ])
+
+        return [story for story in stories if story is not None]
+
+    async def _fetch_story(self, session, semaphore, story_id):
+        """
+        Coroutine fetching a single story and its comment tree.
+
+        @param session: Shared HTTP session.
+        @type session: aiohttp.ClientSession
+        @param semaphore: Semaphore limiting concurrent requests.
+        @type semaphore: asyncio.Semaphore
+        @param story_id: Hacker News story id.
+        @type story_id: int
+        @return: Story with resolved comments or None.
+        @rtype: dict or None
+        """
+        story = await self._fetch_item(session, semaphore, story_id)
+
+        if story is not None:
+            story = dict(story)  # Don't alter cached item
+            story["kids"] = await self._resolve_comment_ids(
+                session, semaphore, story.get("kids"),
+                HackerNewsClient.comments_changed(story)
+            )
+
+        return story
+
+    async def _resolve_comment_ids(self, session, semaphore, comment_ids,
+                                   refresh=False):
+        """
+        Coroutine resolving a comment tree breadth-first, fetching all
+        comments of one level concurrently.
+
+        @param session: Shared HTTP session.
+        @type session: aiohttp.ClientSession
+        @param semaphore: Semaphore limiting concurrent requests.
+        @type semaphore: asyncio.Semaphore
+        @param comment_ids: IDs of the top level comments.
+        @type comment_ids: list
+        @param refresh: Bypass the item cache.
+        @type refresh: bool
+        @return: Flat list of comment documents, ordered by depth and rank.
+        @rtype: list
+        """
+        resolved_comments = []
+        documents = {}
+        level = list(comment_ids or [])
+        depth = 0
+
+        while level:
+            ranks = {}
+            next_level = []
+            resolved_level = await asyncio.gather(*[
+                self._fetch_item(session, semaphore, comment_id, refresh)
+                for comment_id in level
+            ])
+            HackerNewsClient.flush_item_store()
+
+            for comment in resolved_level:
+                document = HackerNewsClient._comment_document(
+                    comment, depth, ranks, documents
+                )
+
+                if document is not None:
+                    resolved_comments.append(document)
+                    next_level.extend(comment.get("kids") or [])
+
+            level = next_level
+            depth += 1
+
+        return resolved_comments
+
+    async def _fetch_item(self, session, semaphore, item_id, refresh=False):
+        """
+        Coroutine fetching a single Hacker News item, using the item cache of
+        the HackerNewsClient.
+
+        @param session: Shared HTTP session.
+        @type session: aiohttp.ClientSession
+        @param semaphore: Semaphore limiting concurrent requests.
+        @type semaphore: asyncio.Semaphore
+        @param item_id: ID of item to be looked up.
+        @type item_id: int
+        @param refresh: Bypass the item cache, the fetched item replaces the
+        cached one.
+        @type refresh: bool
+        @return: Hacker News item or None if it couldn't be retrieved.
+        @rtype: dict or None
+        """
+        item_id = int(item_id)
+
+        item = None if refresh else HackerNewsClient._get_cached_item(item_id)
+        if item is not None:
+            HN_ITEMS.inc(source="cache")
+            return item
+
+        item = await self._fetch_json(
+            session, semaphore, "item/{}.json".format(item_id)
+        )
+        HN_ITEMS.inc(source="api" if item is not None else "failed")
+        HackerNewsClient._cache_item(item_id, item)
+        return item
+
+    async def _fetch_json(self, session, semaphore, path):
+        """
+        Coroutine requesting a resource of the Hacker News API.
+
+        @param session: Shared HTTP session.
+        @type session: aiohttp.ClientSession
+        @param semaphore: Semaphore limiting concurrent requests.
+        @type semaphore: asyncio.Semaphore
+        @param path: Path of the resource relative to the API URI.
+        @type path: str or unicode
+        @return: Decoded response or None if the request failed.
+        @rtype: dict or list or None
+        """
+        resource = "item" if path.startswith("item/") else "topstories"
+
+        try:
+            async with semaphore:
+                start_time = time.time()
+                try:
+                    async with session.get(self.api_uri + path) as response:
+                        response.raise_for_status()
+                        return await response.json()
+                finally:
+                    HN_REQUEST_SECONDS.observe(
+                        time.time() - start_time, resource=resource
+                    )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) \
+                as exception:
+            LOGGER.warning(
+                "Couldn't retrieve {}: {}".format(path, repr(exception))
+            )
+            return None
@@ -6,16 +6,27 @@ Client used to access Hacker news
 
 # STD
 import datetime
+from functools import partial
 import json
 import logging
+import math
+from multiprocessing.pool import ThreadPool
 import time
 
+try:
+    from urlparse import urljoin  # Python 2
+except ImportError:
+    from urllib.parse import urljoin
+
 # EXT
 from hackernews import HackerNews
 
 # PROJECT
 from hackerbabel.clients.client import Client
 from hackerbabel.src.helpers import require_init
+from hackerbabel.src.item_cache import ItemCache, age_based_ttl
+from hackerbabel.src.item_store import ItemStore
+from hackerbabel.src.metrics import lookups_by_result, registry
 
 # CONST
 NEW_NAMES = {
@@ -26,7 +37,17 @@ NEW_NAMES = {
     u"title": u"titles"
 }
 DROPS = {}
+CACHED_ITEM_TYPES = {u"comment"}  # Stories change too often to be cached
 LOGGER = logging.getLogger()
+HN_REQUEST_SECONDS = registry.histogram(
+    "hackerbabel_hn_request_seconds",
+    "Duration of requests to the Hacker News API.", labels=("resource", )
+)
+HN_ITEMS = registry.counter(
+    "hackerbabel_hn_items_total",
+    "Hacker News items looked up, by where they came from.",
+    labels=("source", )
+)
 
 
 class HackerNewsClient(Client):
@@ -34,6 +55,14 @@ class HackerNewsClient(Client):
     target_langs = None
     source_lang = None
     limit = None
+    workers = None
+    batch_size = None
+    pool = None
+    async_backend = None
+    item_cache = None
+    item_store = None
+    item_ttl = None
+    resolved_descendants = None
 
     @classmethod
     def initialize(cls, **init_kwargs):
@@ -46,14 +75,70 @@ class HackerNewsClient(Client):
         cls.limit = init_kwargs.get("NUMBER_OF_STORIES", 10)
         cls.target_langs = init_kwargs.get("TARGET_LANGUAGES", ("PT",))
         cls.source_lang = init_kwargs.get("SOURCE_LANGUAGE", "EN")
+        cls.workers = init_kwargs.get("HN_FETCH_WORKERS", 8)
+        cls.batch_size = init_kwargs.get("HN_FETCH_BATCH_SIZE", 32)
         cls.client = HackerNews()
+        if init_kwargs.get("HN_API_URI"):
+            cls._set_api_uri(init_kwargs["HN_API_URI"])
+        # Pool is shared by all fetches of this client, so the number of
+        # concurrent requests to Hacker News never exceeds the worker count
+        cls.pool = ThreadPool(cls.workers) if cls.workers > 1 else None
+        ttl_settings = {
+            "min_ttl": init_kwargs.get("HN_ITEM_CACHE_MIN_TTL", 60),
+            "max_ttl": init_kwargs.get("HN_ITEM_CACHE_MAX_TTL", 86400),
+            "age_factor": init_kwargs.get("HN_ITEM_CACHE_AGE_FACTOR", 0.1)
+        }
+        cls.item_ttl = partial(age_based_ttl, **ttl_settings)
+        cache_size = init_kwargs.get("HN_ITEM_CACHE_SIZE", 50000)
+        cls.item_cache = ItemCache(
+            cache_size, **ttl_settings
+        ) if cache_size > 0 else None
+        store_path = init_kwargs.get("HN_ITEM_STORE_PATH")
+        # No item is valid longer than the maximum TTL, so it can be removed
+        cls.item_store = ItemStore(
+            store_path, max_age=ttl_settings["max_ttl"]
+        ) if store_path else None
+        # Number of descendants of every top story when its comments were
+        # last resolved, to tell if cached comments might have new replies
+        cls.resolved_descendants = {}
         cls.formatting_functions = {
             u"comments": cls._collect_comments,
             u"date": cls._seconds_to_datestring,
             u"titles": cls._expand_title
         }
+
+        if init_kwargs.get("HN_BACKEND", "threads") == "asyncio":
+            # Only import when selected, requires Python 3.5+ and aiohttp
+            from hackerbabel.clients.async_hackernews_client import (
+                AsyncHackerNewsBackend
+            )
+            cls.async_backend = AsyncHackerNewsBackend(
+                cls.client.base_url,
+                init_kwargs.get("HN_ASYNC_CONNECTIONS", 100),
+                init_kwargs.get("HN_ASYNC_TIMEOUT", 30)
+            )
+        else:
+            cls.async_backend = None
+
         cls.initialized = True
 
+    @classmethod
+    def _set_api_uri(cls, api_uri):
+        """
+        Point the haxor client to another API, e.g. a mirror or a fake server.
+        Newer haxor versions derive the URLs of items and users from the base
+        URL when they are created, so those are replaced as well.
+
+        @param api_uri: Base URL of the API, ending with a slash.
+        @type api_uri: str
+        """
+        cls.client.base_url = api_uri
+
+        for attribute, resource in (("item_url", "item/"),
+                                    ("user_url", "user/")):
+            if hasattr(cls.client, attribute):
+                setattr(cls.client, attribute, urljoin(api_uri, resource))
+
     @classmethod
     @require_init
     def get_top_stories(cls):
@@ -66,20 +151,136 @@ class HackerNewsClient(Client):
         """
         start_time = time.time()
 
+        if cls.item_store is not None:
+            LOGGER.debug("Pruned {} expired item(s) from item store.".format(
+                cls.item_store.prune()
+            ))
+
+        if cls.async_backend:
+            return cls._get_top_stories_async(start_time)
+
+        with HN_REQUEST_SECONDS.time(resource="topstories"):
+            story_ids = cls.client.top_stories(limit=cls.limit)
         top_stories = [
-            json.loads(getattr(cls._resolve_id(story_id), "raw"))
-            for story_id in cls.client.top_stories(cls.limit)
+            story for story in cls._resolve_ids(story_ids)
+            if story is not None
         ]
+        fetch_time = time.time()
+
+        documents = []
+        for story in top_stories:
+            story = dict(story)
+            story["kids"] = cls.resolve_comment_ids(
+                story.get("kids"), refresh=cls.comments_changed(story)
+            )
+            documents.append(cls._jsonify_story(
+                story, cls._story_formatting_functions(), NEW_NAMES, DROPS
+            ))
+        cls._remember_descendants(top_stories)
+
+        end_time = time.time()
+        cls._log_top_stories(top_stories, end_time - start_time)
+        LOGGER.info(
+            "Fetched stories in {} batch(es) of up to {} with {} worker(s) in "
+            "{} second(s), resolved comments in {} second(s); {} of {} "
+            "stories failed.".format(
+                int(math.ceil(len(story_ids) / float(cls.batch_size))),
+                cls.batch_size, cls.workers,
+                round(fetch_time - start_time, 1),
+                round(end_time - fetch_time, 1),
+                len(story_ids) - len(top_stories), len(story_ids)
+            )
+        )
+
+        return documents
+
+    @classmethod
+    def _get_top_stories_async(cls, start_time):
+        """
+        Return the top stories of Hacker News fetched by the asyncio backend.
+
+        @param start_time: Time the request for top stories started.
+        @type start_time: float
+        @return: List of most recent top stories.
+        @rtype: list
+        """
+        top_stories = cls.async_backend.get_top_stories(cls.limit)
+        cls._remember_descendants(top_stories)
 
         documents = [
             cls._jsonify_story(
-                story, cls.formatting_functions, NEW_NAMES, DROPS
+                story, cls._story_formatting_functions(), NEW_NAMES, DROPS
             )
             for story in top_stories
         ]
 
-        end_time = time.time()
-        minutes, seconds = divmod(round((end_time - start_time), 1), 60)
+        cls._log_top_stories(top_stories, time.time() - start_time)
+        LOGGER.info(
+            "Fetched stories and comments on event loop with up to {} "
+            "concurrent request(s).".format(cls.async_backend.connections)
+        )
+
+        return documents
+
+    @classmethod
+    def _story_formatting_functions(cls):
+        """
+        Return the formatting functions for stories whose comments have
+        already been resolved.
+
+        @return: Formatting functions by field.
+        @rtype: dict
+        """
+        return {
+            field: formatting_function
+            for field, formatting_function in cls.formatting_functions.items()
+            if field != u"comments"
+        }
+
+    @classmethod
+    def comments_changed(cls, story):
+        """
+        Check whether the comments of a story might have changed since they
+        were last resolved. Cached comments still list the replies they had
+        when they were fetched, so they can only be used if the number of
+        descendants of their story stayed the same.
+
+        @param story: Freshly fetched Hacker News story.
+        @type story: dict
+        @return: True if the comments have to be fetched again, also if the
+        story's comments haven't been resolved since the client started.
+        @rtype: bool
+        """
+        story_id = story.get("id")
+
+        return story_id not in cls.resolved_descendants or \
+            cls.resolved_descendants[story_id] != story.get("descendants")
+
+    @classmethod
+    def _remember_descendants(cls, stories):
+        """
+        Remember the number of descendants of the current top stories after
+        their comments were resolved. Stories that left the top stories are
+        forgotten.
+
+        @param stories: Hacker News stories.
+        @type stories: list
+        """
+        cls.resolved_descendants = {
+            story["id"]: story.get("descendants") for story in stories
+        }
+
+    @staticmethod
+    def _log_top_stories(top_stories, duration):
+        """
+        Log which top stories were received and how long it took.
+
+        @param top_stories: Received stories.
+        @type top_stories: list
+        @param duration: Duration in seconds.
+        @type duration: float
+        """
+        minutes, seconds = divmod(round(duration, 1), 60)
 
         LOGGER.info(
             "Received {} Hacker News stories in {} minute(s) {} second(s) with "
@@ -89,7 +290,13 @@ class HackerNewsClient(Client):
             )
         )
 
-        return documents
+        if HackerNewsClient.item_cache:
+            LOGGER.info(
+                "Item cache: {size} items, {hits} hits, {misses} misses, "
+                "{evictions} evictions, {expirations} expirations.".format(
+                    **HackerNewsClient.item_cache.statistics()
+                )
+            )
 
     @staticmethod
     def _jsonify_story(story, formatting={}, rename={}, drop=set()):
@@ -176,72 +383,260 @@ class HackerNewsClient(Client):
     @classmethod
     def _collect_comments(cls, comment_ids):
         """
-        Collect comments from story and convert them to strings for MongoDB.
+        Collect comments from story and convert them to documents for MongoDB.
 
         @param comment_ids: List of comment IDs.
         @type comment_ids: list
-        @return: List of converted comment IDs.
+        @return: List of comment documents.
         @rtype: list
         """
         return cls.resolve_comment_ids(comment_ids)
 
     @classmethod
-    def resolve_comment_ids(cls, comments):
+    def resolve_comment_ids(cls, comments, refresh=False):
         """
-        Recursively convert comment IDs to actual text.
+        Convert comment IDs to comment documents. The comment tree is
+        traversed breadth-first, so all comments on the same level are fetched
+        together in concurrent batches instead of one after another.
 
         @param comments: List of story comments
         @type comments: list
-        @return: Story with text comments
-        @rtype: dict
+        @param refresh: Fetch all comments from the API, even if they are
+        cached, and update the cache.
+        @type refresh: bool
+        @return: Flat list of comment documents, ordered by depth and rank.
+        @rtype: list
         """
         # No comments, nothing to resolve / change
         if not comments:
-            return comments
-
-        def _replace_mongo_chars(text):
-            if not text:
-                return text
-
-            # Super stupid workaround because MongoDB doesn't allow . or $,
-            # But this way is less costly than generating comments every time
-            # from their IDs
-            text = text.replace(".", "%&/")
-            text = text.replace("$", "/&%")
-            return text
-
-        def _inner_resolve(comment_ids, level=0):
-            comments = {} if level > 0 else []
-
-            # No comments, return
-            if not comment_ids:
-                return comments
-            for comment_id in comment_ids:
-                comment = cls._resolve_id(comment_id)
-                ccomment_ids = comment.kids
-                comment_text = _replace_mongo_chars(comment.text)
-
-                if comment_text:
-                    if level > 0:
-                        comments[comment_text] = \
-                            _inner_resolve(ccomment_ids, level+1)
-                    else:
-                        comments.append({
-                            comment_text: _inner_resolve(ccomment_ids, level+1)
-                        })
-                return comments
-
-        resolved_comments = _inner_resolve(comments)
+            return []
+
+        resolved_comments = []
+        documents = {}
+        level = list(comments)
+        depth = 0
+
+        while level:
+            ranks = {}
+            next_level = []
+
+            for comment in cls._resolve_ids(level, refresh):
+                document = cls._comment_document(
+                    comment, depth, ranks, documents
+                )
+
+                if document is not None:
+                    resolved_comments.append(document)
+                    next_level.extend(comment.get("kids") or [])
+
+            level = next_level
+            depth += 1
+
         return resolved_comments
 
     @classmethod
-    def _resolve_id(cls, item_id):
+    def _comment_document(cls, comment, depth, ranks, documents):
+        """
+        Convert a resolved comment to a document for the comment collection.
+        Besides its position in the tree, every document knows the top level
+        comment of its thread and its number of replies, so threads can be
+        loaded separately.
+
+        @param comment: Resolved Hacker News comment.
+        @type comment: dict or None
+        @param depth: Depth of the comment in the comment tree (0 for top
+        level comments).
+        @type depth: int
+        @param ranks: Number of comments per parent on this level seen so far,
+        gets updated.
+        @type ranks: dict
+        @param documents: Comment documents of the story created so far by ID,
+        gets updated.
+        @type documents: dict
+        @return: Comment document or None if the comment couldn't be resolved,
+        was deleted or is empty.
+        @rtype: dict or None
+        """
+        if not comment or not comment.get("text"):
+            return None
+
+        parent = comment.get("parent")
+        rank = ranks.get(parent, 0)
+        ranks[parent] = rank + 1
+
+        thread = comment["id"]
+        parent_document = documents.get(parent)
+        if parent_document is not None:
+            parent_document["reply_count"] += 1
+            thread = parent_document["thread"]
+
+        document = {
+            "id": comment["id"],
+            "parent": parent,
+            "thread": thread,
+            "depth": depth,
+            "rank": rank,
+            "reply_count": 0,
+            "text": comment["text"],
+            "author": comment.get("by"),
+            "date": cls._seconds_to_datestring(comment.get("time", 0))
+        }
+        documents[document["id"]] = document
+
+        return document
+
+    @classmethod
+    def _resolve_ids(cls, item_ids, refresh=False):
+        """
+        Look up several Hacker News items, using the client's worker pool if
+        there is one. Items are fetched in batches; the order of the results
+        corresponds to the order of the IDs.
+
+        @param item_ids: IDs of items to be looked up.
+        @type item_ids: list
+        @param refresh: Bypass the item cache.
+        @type refresh: bool
+        @return: Hacker News items as dictionaries, None for items that
+        couldn't be retrieved.
+        @rtype: list
+        """
+        item_ids = list(item_ids)
+        items = []
+        resolve = partial(cls._try_resolve_id, refresh=refresh)
+
+        for offset in range(0, len(item_ids), cls.batch_size):
+            batch = item_ids[offset:offset + cls.batch_size]
+            start_time = time.time()
+
+            if cls.pool:
+                batch_items = cls.pool.map(resolve, batch)
+            else:
+                batch_items = [resolve(item_id) for item_id in batch]
+            items.extend(batch_items)
+            cls.flush_item_store()
+
+            LOGGER.debug(
+                "Resolved batch of {} Hacker News items in {} second(s) "
+                "({} failed).".format(
+                    len(batch), round(time.time() - start_time, 2),
+                    batch_items.count(None)
+                )
+            )
+
+        return items
+
+    @classmethod
+    def _try_resolve_id(cls, item_id, refresh=False):
+        """
+        Look up Hacker News object related to an ID, but log errors instead
+        of raising them, so one failing item doesn't stop a whole batch.
+
+        @param item_id: ID of item to be looked up.
+        @param refresh: Bypass the item cache.
+        @type refresh: bool
+        @return: Hacker News item or None
+        @rtype: dict or None
+        """
+        try:
+            return cls._resolve_id(item_id, refresh)
+        except Exception as exception:
+            HN_ITEMS.inc(source="failed")
+            LOGGER.warning(
+                "Couldn't resolve Hacker News item {}: {}".format(
+                    item_id, repr(exception)
+                )
+            )
+            return None
+
+    @classmethod
+    def _resolve_id(cls, item_id, refresh=False):
         """
-        Look up Hacker News object related to an ID.
+        Look up Hacker News object related to an ID. Comments are served from
+        the item cache if possible.
 
         @param item_id: ID of item to be looked up.
+        @param refresh: Bypass the item cache, the fetched item replaces the
+        cached one.
+        @type refresh: bool
         @return: Hacker News item
-        @rtype: object
+        @rtype: dict
         """
         item_id = int(item_id)
-        return cls.client.get_item(item_id)
+
+        item = None if refresh else cls._get_cached_item(item_id)
+        if item is not None:
+            HN_ITEMS.inc(source="cache")
+            return item
+
+        with HN_REQUEST_SECONDS.time(resource="item"):
+            item = json.loads(cls.client.get_item(item_id).raw)
+        HN_ITEMS.inc(source="api")
+        cls._cache_item(item_id, item)
+        return item
+
+    @classmethod
+    def _get_cached_item(cls, item_id):
+        """
+        Look up an item in the item cache, then in the persistent item store.
+        Items from the store are only used if they haven't expired yet.
+
+        @param item_id: ID of item to be looked up.
+        @type item_id: int
+        @return: Hacker News item or None
+        @rtype: dict or None
+        """
+        if cls.item_cache is not None:
+            item = cls.item_cache.get(item_id)
+            if item is not None:
+                return item
+
+        if cls.item_store is not None:
+            stored = cls.item_store.get(item_id)
+
+            if stored is not None:
+                item, fetched = stored
+
+                if time.time() < fetched + cls.item_ttl(item, fetched):
+                    if cls.item_cache is not None:
+                        cls.item_cache.set(item_id, item, fetched)
+                    return item
+
+        return None
+
+    @classmethod
+    def _cache_item(cls, item_id, item):
+        """
+        Add a freshly fetched item to the item cache and the persistent item
+        store if its type allows it.
+
+        @param item_id: ID of item.
+        @type item_id: int
+        @param item: Hacker News item.
+        @type item: dict or None
+        """
+        if not item or item.get("type") not in CACHED_ITEM_TYPES:
+            return
+
+        fetched = time.time()
+
+        if cls.item_cache is not None:
+            cls.item_cache.set(item_id, item, fetched)
+        if cls.item_store is not None:
+            cls.item_store.put(item_id, item, fetched)
+
+    @classmethod
+    def flush_item_store(cls):
+        """
+        Write the items added to the persistent item store since the last
+        flush in one transaction.
+        """
+        if cls.item_store is not None:
+            cls.item_store.flush()
+
+
+registry.counter(
+    "hackerbabel_item_cache_lookups_total",
+    "Lookups in the cache of Hacker News items, by result.",
+    labels=("result", ),
+    function=lookups_by_result(lambda: HackerNewsClient.item_cache)
+)
@@ -4,15 +4,65 @@
 Client used to access MongoDB
 """
 
+# STD
+import logging
+import time
+
 # EXT
-from pymongo import MongoClient
+from pymongo import (
+    ASCENDING, DESCENDING, IndexModel, MongoClient, ReplaceOne, UpdateOne
+)
+from pymongo.errors import PyMongoError
 from bson.objectid import ObjectId
 
 # PROJECT
 from hackerbabel.clients.client import Client
 from hackerbabel.src.helpers import require_init
+from hackerbabel.src.metrics import registry, timed
 from hackerbabel.src.schema import ArticleSchema
 
+# CONST
+LOGGER = logging.getLogger(__name__)
+OPERATION_SECONDS = registry.histogram(
+    "hackerbabel_mongodb_operation_seconds",
+    "Duration of MongoDB operations, by method of the MongoDBClient.",
+    labels=("method", )
+)
+# Indexes of every collection, keyed by the config entry holding the
+# collection's name. "{lang}" in a field is replaced by every target language.
+INDEXES = {
+    "STORY_COLLECTION": [
+        {"keys": [("id", ASCENDING), ("_id", DESCENDING)]},
+        {"keys": [
+            ("refreshed", DESCENDING), ("rank", DESCENDING),
+            ("_id", DESCENDING)
+        ]},
+        {"keys": [("titles.{lang}.translation_status", ASCENDING)]}
+    ],
+    "COMMENT_COLLECTION": [
+        {"keys": [("id", ASCENDING)], "unique": True},
+        {"keys": [
+            ("story_id", ASCENDING), ("depth", ASCENDING), ("rank", ASCENDING)
+        ]},
+        {"keys": [
+            ("story_id", ASCENDING), ("parent", ASCENDING), ("rank", ASCENDING)
+        ]},
+        {"keys": [
+            ("story_id", ASCENDING), ("thread", ASCENDING),
+            ("depth", ASCENDING), ("rank", ASCENDING)
+        ]}
+    ],
+    "TITLE_COLLECTION": [
+        {"keys": [("key", ASCENDING)], "unique": True}
+    ]
+}
+# Indexes created by earlier versions that are dropped at start. "date" is a
+# day-first string, so it neither sorts chronologically nor is it queried. The
+# newest stories are also sorted by "_id", which is now part of their index.
+OBSOLETE_INDEXES = {
+    "STORY_COLLECTION": ["date_-1", "refreshed_-1_rank_-1"]
+}
+
 
 class MongoDBClient(Client):
     """
@@ -21,6 +71,7 @@ class MongoDBClient(Client):
     db = None
     schema = None
     number_of_stories = None
+    index_build_times = None
 
     @classmethod
     def initialize(cls, **init_kwargs):
@@ -53,10 +104,96 @@ class MongoDBClient(Client):
         cls.client = MongoClient(uri)
         cls.db = getattr(cls.client, database)
         cls.schema = ArticleSchema()
+        cls.create_indexes(
+            {
+                config_key: init_kwargs.get(config_key)
+                for config_key in INDEXES if init_kwargs.get(config_key)
+            },
+            init_kwargs.get("TARGET_LANGUAGES", ("PT", ))
+        )
         cls.initialized = True
 
+    @classmethod
+    def create_indexes(cls, collection_names, target_langs):
+        """
+        Create the indexes declared in INDEXES and drop those listed in
+        OBSOLETE_INDEXES. Existing indexes are left untouched, so this can be
+        called at every start.
+
+        @param collection_names: Names of the collections by config entry.
+        @type collection_names: dict
+        @param target_langs: Languages titles are translated into.
+        @type target_langs: tuple
+        """
+        cls.index_build_times = {}
+
+        for config_key, collection_name in collection_names.items():
+            models = []
+
+            for index in INDEXES[config_key]:
+                # Expand language dependent indexes
+                langs = target_langs if any(
+                    "{lang}" in field for field, _ in index["keys"]
+                ) else (None, )
+
+                for lang in langs:
+                    models.append(IndexModel(
+                        [
+                            (field.format(lang=lang), direction)
+                            for field, direction in index["keys"]
+                        ],
+                        unique=index.get("unique", False)
+                    ))
+
+            collection = getattr(cls.db, collection_name)
+            existing_indexes = collection.index_information()
+            for name in OBSOLETE_INDEXES.get(config_key, []):
+                if name in existing_indexes:
+                    collection.drop_index(name)
+                    LOGGER.info(
+                        "Dropped obsolete index {} on collection '{}'.".format(
+                            name, collection_name
+                        )
+                    )
+
+            start_time = time.time()
+            names = collection.create_indexes(models)
+            build_time = time.time() - start_time
+            cls.index_build_times[collection_name] = build_time
+
+            LOGGER.info(
+                "Ensured {} index(es) on collection '{}' in {} second(s): "
+                "{}".format(
+                    len(names), collection_name, round(build_time, 3),
+                    ", ".join(names)
+                )
+            )
+
+    @classmethod
+    @require_init
+    def get_index_statistics(cls, collection_name):
+        """
+        Get usage statistics of the indexes of a collection.
+
+        @param collection_name: Name of the collection.
+        @type collection_name: str or unicode
+        @return: Number of operations that used the index and since when
+        they are counted, by index name.
+        @rtype: dict
+        """
+        collection = getattr(cls.db, collection_name)
+
+        return {
+            statistics["name"]: {
+                "ops": statistics["accesses"]["ops"],
+                "since": statistics["accesses"]["since"]
+            }
+            for statistics in collection.aggregate([{"$indexStats": {}}])
+        }
+
     @classmethod
     @require_init
+    @timed(OPERATION_SECONDS, method="add_document")
     def add_document(cls, document, collection_name, schema=None):
         """
         Add new document to a collection.
@@ -81,6 +218,58 @@ class MongoDBClient(Client):
 
     @classmethod
     @require_init
+    @timed(OPERATION_SECONDS, method="upsert_documents")
+    def upsert_documents(cls, documents, collection_name, key,
+                         insert_only_fields=()):
+        """
+        Update documents identified by a key or insert them if they don't exist
+        yet, all in one bulk write.
+
+        @param documents: MongoDB documents to be written.
+        @type documents: list
+        @param collection_name: Name of the collection the documents should be
+        written to.
+        @type collection_name: str or unicode
+        @param key: Field identifying a document, e.g. the Hacker News id.
+        @type key: str or unicode
+        @param insert_only_fields: Fields that are only written when a document
+        is inserted and never overwritten afterwards.
+        @type insert_only_fields: tuple
+        @return: MongoDB IDs (_id) of inserted documents by their key
+        @rtype: dict
+        """
+        if not documents:
+            return {}
+
+        collection = getattr(cls.db, collection_name)
+        operations = []
+
+        for document in documents:
+            updates = {
+                field: value for field, value in document.items()
+                if field not in insert_only_fields and field != "_id"
+            }
+            inserts = {
+                field: document[field] for field in insert_only_fields
+                if field in document
+            }
+            update = {"$set": updates}
+            if inserts:
+                update["$setOnInsert"] = inserts
+
+            operations.append(
+                UpdateOne({key: document[key]}, update, upsert=True)
+            )
+
+        result = collection.bulk_write(operations, ordered=False)
+        return {
+            documents[index][key]: _id
+            for index, _id in result.upserted_ids.items()
+        }
+
+    @classmethod
+    @require_init
+    @timed(OPERATION_SECONDS, method="find_document")
     def find_document(cls, key, value, collection_name, sort_direction=-1):
         """
         Find a document inside a collection.
@@ -101,19 +290,133 @@ class MongoDBClient(Client):
         collection = getattr(cls.db, collection_name)
         if key == "_id":
             value = ObjectId(value)
-        result = [
-            document for document in
-            collection.find({key: value}).sort("_id", sort_direction)
-        ]
-        if len(result) == 0:
-            return None
-        return result[0]
+        return collection.find_one(
+            {key: value}, sort=[("_id", sort_direction)]
+        )
+
+    @classmethod
+    @require_init
+    @timed(OPERATION_SECONDS, method="find_latest_documents")
+    def find_latest_documents(cls, key, values, collection_name, fields):
+        """
+        Find the latest version of the documents with one of several values
+        for a key, with a single query.
+
+        @param key: Attribute the documents should possess
+        @type key: str or unicode
+        @param values: Values that should correspond to the key.
+        @type values: list
+        @param collection_name: Name of the collection the documents are stored
+        in.
+        @type collection_name: str or unicode
+        @param fields: Fields that should be retrieved besides the key.
+        @type fields: tuple
+        @return: Latest document by value of the key
+        @rtype: dict
+        """
+        collection = getattr(cls.db, collection_name)
+        projection = {field: True for field in fields}
+        projection[key] = True
+
+        documents = {}
+        cursor = collection.find(
+            {key: {"$in": list(values)}}, projection
+        ).sort("_id", -1)
+
+        for document in cursor:
+            # Newest version comes first
+            documents.setdefault(document[key], document)
+
+        return documents
+
+    @classmethod
+    @require_init
+    @timed(OPERATION_SECONDS, method="find_documents")
+    def find_documents(cls, query, collection_name, sort=None, skip=0,
+                       limit=0, projection=None):
+        """
+        Find all documents inside a collection matching a query.
+
+        @param query: MongoDB query.
+        @type query: dict
+        @param collection_name: Name of the collection the documents are stored
+        in.
+        @type collection_name: str or unicode
+        @param sort: List of (key, direction) pairs the documents are sorted by.
+        @type sort: list or None
+        @param skip: Number of matching documents to skip.
+        @type skip: int
+        @param limit: Maximum number of documents (0 for no limit).
+        @type limit: int
+        @param projection: Fields that should be included / excluded.
+        @type projection: dict or None
+        @return: Matching documents
+        @rtype: list
+        """
+        collection = getattr(cls.db, collection_name)
+        cursor = collection.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        return list(cursor.skip(skip).limit(limit))
+
+    @classmethod
+    @require_init
+    @timed(OPERATION_SECONDS, method="count_documents")
+    def count_documents(cls, query, collection_name):
+        """
+        Count the documents inside a collection matching a query.
+
+        @param query: MongoDB query.
+        @type query: dict
+        @param collection_name: Name of the collection the documents are stored
+        in.
+        @type collection_name: str or unicode
+        @return: Number of matching documents
+        @rtype: int
+        """
+        collection = getattr(cls.db, collection_name)
+        return collection.count_documents(query)
+
+    @classmethod
+    @require_init
+    @timed(OPERATION_SECONDS, method="replace_comments")
+    def replace_comments(cls, story_id, comments, collection_name):
+        """
+        Replace the stored comments of a story with new comment documents.
+        Comments that don't exist anymore are removed.
+
+        @param story_id: Hacker News story id.
+        @type story_id: int
+        @param comments: Comment documents, see
+        HackerNewsClient.resolve_comment_ids().
+        @type comments: list
+        @param collection_name: Name of the comment collection.
+        @type collection_name: str or unicode
+        """
+        collection = getattr(cls.db, collection_name)
+
+        if comments:
+            collection.bulk_write([
+                ReplaceOne(
+                    {"id": comment["id"]},
+                    dict(comment, story_id=story_id),
+                    upsert=True
+                )
+                for comment in comments
+            ], ordered=False)
+
+        collection.delete_many({
+            "story_id": story_id,
+            "id": {"$nin": [comment["id"] for comment in comments]}
+        })
 
     @classmethod
     @require_init
+    @timed(OPERATION_SECONDS, method="get_newest_documents")
     def get_newest_documents(cls, collection_name):
         """
-        Get the newest documents acquired during the last run of the daemon.
+        Get the newest documents acquired during the last run of the daemon,
+        starting with the lowest ranked one.
 
         @param collection_name: Name of the collection the document should be
         added to.
@@ -124,12 +427,15 @@ class MongoDBClient(Client):
         collection = getattr(cls.db, collection_name)
         newest_documents = [
             document for document in
-            collection.find().sort("_id", -1).limit(cls.number_of_stories)
+            collection.find().sort(
+                [("refreshed", -1), ("rank", -1), ("_id", -1)]
+            ).limit(cls.number_of_stories)
         ]
         return newest_documents
 
     @classmethod
     @require_init
+    @timed(OPERATION_SECONDS, method="update_document")
     def update_document(cls, collection_name, document_id, updates):
         """
         Update an existing document.
@@ -150,3 +456,57 @@ class MongoDBClient(Client):
             {"$set": updates},
         )
         return report
+
+
+def _index_build_seconds():
+    """
+    Return how long ensuring the indexes of every collection took at start.
+
+    @return: Duration in seconds by collection name (as tuple).
+    @rtype: dict
+    """
+    return {
+        (collection_name, ): build_time
+        for collection_name, build_time in
+        (MongoDBClient.index_build_times or {}).items()
+    }
+
+
+def _index_accesses():
+    """
+    Return how often every index was used, as counted by the MongoDB server.
+    Collections whose statistics can't be retrieved (e.g. because the server
+    doesn't support $indexStats) are skipped.
+
+    @return: Number of operations by collection and index name (as tuple).
+    @rtype: dict
+    """
+    accesses = {}
+
+    for collection_name in MongoDBClient.index_build_times or {}:
+        try:
+            statistics = MongoDBClient.get_index_statistics(collection_name)
+        except (PyMongoError, NotImplementedError) as error:
+            LOGGER.debug(
+                "Couldn't get index statistics of collection '{}': {}".format(
+                    collection_name, repr(error)
+                )
+            )
+            continue
+
+        for index_name, usage in statistics.items():
+            accesses[(collection_name, index_name)] = usage["ops"]
+
+    return accesses
+
+
+registry.gauge(
+    "hackerbabel_mongodb_index_build_seconds",
+    "Time it took to ensure the indexes of a collection at start.",
+    labels=("collection", ), function=_index_build_seconds
+)
+registry.counter(
+    "hackerbabel_mongodb_index_accesses_total",
+    "Operations that used an index since the MongoDB server counts them.",
+    labels=("collection", "index"), function=_index_accesses
+)
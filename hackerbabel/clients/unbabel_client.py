@@ -6,11 +6,34 @@ Client used to access the Unbabel API (in sandbox mode, though)
 
 # STD
 import json
+import time
+
+# EXT
 import requests
+from requests.adapters import HTTPAdapter
 
 # PROJECT
 from hackerbabel.clients.client import Client
 from hackerbabel.src.helpers import require_init
+from hackerbabel.src.metrics import registry
+from hackerbabel.src.resilience import CircuitBreaker
+
+# CONST
+CONTENT_TYPE_HEADER = {'Content-Type': 'application/json; charset=utf-8'}
+# Resubmissions with the same key are meant to return the job created first
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+CIRCUIT_BREAKER_STATES = (
+    CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN
+)
+REQUEST_SECONDS = registry.histogram(
+    "hackerbabel_unbabel_request_seconds",
+    "Duration of requests to the Unbabel API.", labels=("method", )
+)
+RESPONSES = registry.counter(
+    "hackerbabel_unbabel_responses_total",
+    "Responses of the Unbabel API by status code, \"error\" if there was "
+    "none.", labels=("method", "status")
+)
 
 
 class UnbabelClient(Client):
@@ -18,6 +41,13 @@ class UnbabelClient(Client):
     mail = None
     api_secret = None
     api_uri = None
+    session = None
+    headers = None
+    timeout = None
+    max_retries = None
+    retry_base_delay = None
+    retry_max_delay = None
+    circuit_breaker = None
 
     @classmethod
     def initialize(cls, **init_kwargs):
@@ -41,10 +71,35 @@ class UnbabelClient(Client):
                     )
                 )
             )
+
+        # Share one session between all threads, so connections to the API are
+        # kept alive and reused instead of opening a new one for every request
+        pool_size = init_kwargs.get("UNBABEL_POOL_SIZE", 10)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=True
+        )
+        cls.session = requests.Session()
+        cls.session.mount("http://", adapter)
+        cls.session.mount("https://", adapter)
+        cls.timeout = (
+            init_kwargs.get("UNBABEL_CONNECT_TIMEOUT", 5),
+            init_kwargs.get("UNBABEL_READ_TIMEOUT", 30)
+        )
+        cls.headers = dict(CONTENT_TYPE_HEADER)
+        cls.headers.update(cls.build_authorization_header())
+
+        # Resubmissions when the API fails
+        cls.max_retries = init_kwargs.get("UNBABEL_MAX_RETRIES", 5)
+        cls.retry_base_delay = init_kwargs.get("UNBABEL_RETRY_BASE_DELAY", 1)
+        cls.retry_max_delay = init_kwargs.get("UNBABEL_RETRY_MAX_DELAY", 60)
+        cls.circuit_breaker = CircuitBreaker(
+            init_kwargs.get("UNBABEL_BREAKER_THRESHOLD", 5),
+            init_kwargs.get("UNBABEL_BREAKER_RESET_TIMEOUT", 60)
+        )
+
         cls.initialized = True
 
     @classmethod
-    @require_init
     def build_authorization_header(cls):
         """
         Build the authorization header for an API request.
@@ -60,7 +115,8 @@ class UnbabelClient(Client):
 
     @classmethod
     @require_init
-    def make_translation_request(cls, text, target_lang, **additional_data):
+    def make_translation_request(cls, text, target_lang, idempotency_key=None,
+                                 **additional_data):
         """
         Request the API to translate a text.
 
@@ -68,19 +124,23 @@ class UnbabelClient(Client):
         @type text: str or unicode
         @param target_lang: Language the text should be translated into.
         @type target_lang: str or unicode
+        @param idempotency_key: Key identifying the job, sent with every
+        submission of it, so a resubmission doesn't create a second job.
+        @type idempotency_key: str or unicode or None
         @param additional_data: Additional data added to the request.
         @type additional_data: dict
         @return: Response to request
         @type: Response
         """
-        authorization_header = cls.build_authorization_header()
         data = {
             "text": text, "target_language": target_lang.lower()
         }
         data.update(additional_data)
-        return cls.make_api_request(
-            "POST", cls.api_uri, data, authorization_header
-        )
+        headers = dict(cls.headers)
+        if idempotency_key is not None:
+            headers[IDEMPOTENCY_KEY_HEADER] = idempotency_key
+
+        return cls.make_api_request("POST", cls.api_uri, data, headers)
 
     @classmethod
     @require_init
@@ -93,17 +153,18 @@ class UnbabelClient(Client):
         @return: Response to request
         @type: Response
         """
-        authorization_header = cls.build_authorization_header()
         return cls.make_api_request(
-            "GET", headers=authorization_header, uri="{uri}{uid}/".format(
+            "GET", headers=cls.headers, uri="{uri}{uid}/".format(
                 uri=cls.api_uri, uid=uid
             )
         )
 
     @classmethod
-    def make_api_request(cls, request_type, uri, data={}, headers={}, **kwargs):
+    def make_api_request(cls, request_type, uri, data=None, headers=None,
+                         **kwargs):
         """
-        Make an request to an API.
+        Make an request to an API. Uses the client's pooled session and
+        timeouts once the client is initialized.
 
         @param request_type: Type of request, e.g. GET / PUT / POST / DELETE...
         @type request_type: str or unicode
@@ -118,10 +179,54 @@ class UnbabelClient(Client):
         @return: Response to request.
         @type: Response
         """
-        headers.update({'Content-Type': 'application/json; charset=utf-8'})
-        data = json.dumps(data)
+        if headers is None:
+            headers = CONTENT_TYPE_HEADER
+        elif "Content-Type" not in headers:
+            headers = dict(headers, **CONTENT_TYPE_HEADER)
+        data = json.dumps({} if data is None else data)
 
-        response = getattr(requests, request_type.lower())(
-            uri, data=data, headers=headers, **kwargs
-        )
+        kwargs.setdefault("timeout", cls.timeout)
+        session = cls.session if cls.session is not None else requests
+
+        method = request_type.upper()
+        start_time = time.time()
+
+        try:
+            response = session.request(
+                method, uri, data=data, headers=headers, **kwargs
+            )
+        except Exception:
+            RESPONSES.inc(method=method, status="error")
+            raise
+        finally:
+            REQUEST_SECONDS.observe(time.time() - start_time, method=method)
+
+        RESPONSES.inc(method=method, status=response.status_code)
         return response
+
+
+def _circuit_breaker_state():
+    """
+    Return the current state of the circuit breaker guarding the Unbabel API
+    for the circuit breaker gauge.
+
+    @return: 1 for the current state and 0 for every other state, by state
+    (as tuple). Empty, i.e. no samples, as long as the client isn't
+    initialized and has no circuit breaker yet.
+    @rtype: dict
+    """
+    if UnbabelClient.circuit_breaker is None:
+        return {}
+
+    state = UnbabelClient.circuit_breaker.statistics()["state"]
+    return {
+        (candidate, ): int(candidate == state)
+        for candidate in CIRCUIT_BREAKER_STATES
+    }
+
+
+registry.gauge(
+    "hackerbabel_unbabel_circuit_breaker_state",
+    "Current state of the circuit breaker guarding the Unbabel API (1 for "
+    "the current state).", labels=("state", ), function=_circuit_breaker_state
+)
@@ -20,3 +20,49 @@ SOURCE_LANGUAGE = "EN"
 STORY_COLLECTION = "articles"
 COMMENT_COLLECTION = "comments"
 TITLE_COLLECTION = "titles"
+HN_FETCH_WORKERS = 8
+HN_FETCH_BATCH_SIZE = 32
+HN_API_URI = "https://hacker-news.firebaseio.com/v0/"
+HN_BACKEND = "threads"  # Or "asyncio" (requires Python 3.5+ and aiohttp)
+HN_ASYNC_CONNECTIONS = 100
+HN_ASYNC_TIMEOUT = 30
+HN_ITEM_CACHE_SIZE = 50000  # 0 disables the item cache
+HN_ITEM_CACHE_MIN_TTL = 60
+HN_ITEM_CACHE_MAX_TTL = 86400
+HN_ITEM_CACHE_AGE_FACTOR = 0.1
+HN_ITEM_STORE_PATH = "data/hackernews_items.db"  # None disables the store
+COMMENTS_PER_PAGE = 20
+TRANSLATION_WORKERS = 4
+TRANSLATION_POLL_MIN_INTERVAL = 5
+TRANSLATION_POLL_MAX_INTERVAL = 60
+TRANSLATION_POLL_BACKOFF = 1.5
+TRANSLATION_POLL_WORKERS = 8
+TRANSLATION_POLL_MAX_AGE = 86400  # Unfinished jobs are given up afterwards
+UNBABEL_POOL_SIZE = 10  # Kept-alive connections to the Unbabel API
+UNBABEL_CONNECT_TIMEOUT = 5
+UNBABEL_READ_TIMEOUT = 30
+UNBABEL_MAX_RETRIES = 5
+UNBABEL_RETRY_BASE_DELAY = 1
+UNBABEL_RETRY_MAX_DELAY = 60
+UNBABEL_BREAKER_THRESHOLD = 5  # Consecutive failures before pausing requests
+UNBABEL_BREAKER_RESET_TIMEOUT = 60
+TRANSLATION_MEMORY_CACHE_SIZE = 10000
+PAGE_CACHE_TIMEOUT = 86400  # Pages are invalidated when their data changes
+CACHE_TYPE = "filesystem"  # Or "simple", "redis", "memcached", "null"
+CACHE_DIR = "data/page_cache"
+CACHE_THRESHOLD = 500  # Maximum number of pages for simple / filesystem
+CACHE_REDIS_URL = "redis://localhost:6379/0"
+CACHE_MEMCACHED_SERVERS = ("127.0.0.1:11211", )
+CACHE_KEY_PREFIX = "hackerbabel_"
+EVENT_KEEPALIVE = 15  # Seconds between keepalive messages of event streams
+COMPRESS_MIN_SIZE = 500  # Smaller HTML and JSON responses aren't compressed
+COMPRESS_LEVEL = 6
+START_DAEMON = True  # False only serves the stories stored already
+PROFILING_ENABLED = False  # Nothing is hooked into requests or cycles if False
+PROFILING_MODE = "sampling"  # Collapsed stacks for flame graphs or "cprofile"
+PROFILING_SAMPLE_RATE = 0.01  # Fraction of requests and refresh cycles
+PROFILING_HEADER = "X-Hackerbabel-Profile"  # Forces a profile with the token
+PROFILING_TOKEN = None  # Without a token, the header only works in debug mode
+PROFILING_INTERVAL = 0.005  # Seconds between stack samples
+PROFILING_DIR = "data/profiles"
+PROFILING_RETENTION = 100  # Number of profiles kept
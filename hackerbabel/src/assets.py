@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pipeline for static assets: At startup, every asset is replaced by its
+minified variant if there is one, fingerprinted with a hash of its content and
+compressed once. Fingerprinted assets never change, so clients can cache them
+forever. Also compresses HTML and JSON responses on the fly.
+"""
+
+# STD
+import gzip
+import hashlib
+from io import BytesIO
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+
+# EXT
+from flask import abort, current_app, request, url_for, Blueprint, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Brotli compression is optional
+
+# CONST
+LOGGER = logging.getLogger(__name__)
+ASSETS = Blueprint('assets', __name__)
+ONE_YEAR = 365 * 24 * 60 * 60
+COMPRESSIBLE_TYPES = {
+    "text/css", "text/html", "application/javascript", "text/javascript",
+    "application/json", "image/svg+xml", "text/plain"
+}
+# References to other assets inside stylesheets
+CSS_REFERENCE = re.compile(
+    r"""(url\(\s*['"]?|@import\s+['"])([^'")?#]+)([^'")]*['"]?)"""
+)
+
+
+def gzip_compress(data, level=6):
+    """
+    Compress data with gzip.
+
+    @param data: Data to be compressed.
+    @type data: bytes
+    @param level: Compression level between 1 and 9.
+    @type level: int
+    @return: Compressed data.
+    @rtype: bytes
+    """
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=level,
+                       mtime=0) as gzip_file:
+        gzip_file.write(data)
+    return buffer.getvalue()
+
+
+class Asset(object):
+    """
+    Static asset in all its encodings.
+    """
+    def __init__(self, name, data, mimetype):
+        """
+        Initializer.
+
+        @param name: Fingerprinted name of asset.
+        @type name: str
+        @param data: Content of asset.
+        @type data: bytes
+        @param mimetype: MIME type of asset.
+        @type mimetype: str
+        """
+        self.name = name
+        self.mimetype = mimetype
+        self.encodings = {"identity": data}
+
+        if mimetype in COMPRESSIBLE_TYPES:
+            self.encodings["gzip"] = gzip_compress(data, 9)
+            if brotli is not None:
+                self.encodings["br"] = brotli.compress(data)
+
+    def negotiate(self, accept_encodings):
+        """
+        Choose the smallest encoding the client accepts.
+
+        @param accept_encodings: Accept-Encoding header of request.
+        @type accept_encodings: werkzeug.datastructures.Accept
+        @return: Encoding and encoded content.
+        @rtype: tuple
+        """
+        accepted = [
+            encoding for encoding in self.encodings
+            if encoding == "identity" or encoding in accept_encodings
+        ]
+        encoding = min(
+            accepted, key=lambda encoding: len(self.encodings[encoding])
+        )
+        return encoding, self.encodings[encoding]
+
+
+class AssetPipeline(object):
+    """
+    Build the assets of a static folder and serve them, see the module's
+    docstring. Templates get the fingerprinted URL of an asset via
+    asset_url(filename).
+    """
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.assets = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Build the assets of the app's static folder and register everything
+        with the app.
+
+        @param app: Flask app
+        @type app: flask.Flask
+        """
+        self.build(app.static_folder)
+
+        app.extensions["assets"] = self
+        app.register_blueprint(ASSETS)
+        app.jinja_env.globals["asset_url"] = asset_url
+        app.after_request(compress_response)
+
+        LOGGER.info(
+            "Built {} assets{}.".format(
+                len(self.assets),
+                "" if brotli is not None else " (brotli not installed)"
+            )
+        )
+
+    def build(self, static_folder):
+        """
+        Fingerprint and compress all assets in a folder.
+
+        @param static_folder: Folder containing the assets.
+        @type static_folder: str or unicode
+        """
+        names = set()
+        for directory, _, filenames in os.walk(static_folder):
+            for filename in filenames:
+                names.add(
+                    os.path.relpath(
+                        os.path.join(directory, filename), static_folder
+                    ).replace(os.sep, "/")
+                )
+
+        for name in sorted(names):
+            self._build_asset(static_folder, name, names)
+
+    def url(self, filename):
+        """
+        Return the fingerprinted name of an asset.
+
+        @param filename: Name of asset relative to the static folder.
+        @type filename: str
+        @return: Fingerprinted name or None if the asset is unknown.
+        @rtype: str or None
+        """
+        return self.manifest.get(filename)
+
+    def _build_asset(self, static_folder, name, names):
+        """
+        Build an asset and the assets it references.
+
+        @param static_folder: Folder containing the assets.
+        @type static_folder: str or unicode
+        @param name: Name of asset relative to the static folder.
+        @type name: str
+        @param names: Names of all assets in the folder.
+        @type names: set
+        @return: Fingerprinted name of the asset.
+        @rtype: str
+        """
+        if name in self.manifest:
+            return self.manifest[name]
+
+        # Serve the minified variant instead, if there is one
+        root, extension = posixpath.splitext(name)
+        source = name
+        if not root.endswith(".min") and root + ".min" + extension in names:
+            source = root + ".min" + extension
+
+        with open(os.path.join(static_folder, source), "rb") as asset_file:
+            data = asset_file.read()
+
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if mimetype == "text/css":
+            data = self._fingerprint_references(
+                static_folder, name, data, names
+            )
+
+        fingerprint = hashlib.sha1(data).hexdigest()[:12]
+        fingerprinted = "{}.{}{}".format(root, fingerprint, extension)
+
+        self.manifest[name] = fingerprinted
+        self.assets[fingerprinted] = Asset(fingerprinted, data, mimetype)
+        return fingerprinted
+
+    def _fingerprint_references(self, static_folder, name, data, names):
+        """
+        Replace references to other assets inside a stylesheet by their
+        fingerprinted names.
+
+        @param static_folder: Folder containing the assets.
+        @type static_folder: str or unicode
+        @param name: Name of stylesheet relative to the static folder.
+        @type name: str
+        @param data: Content of stylesheet.
+        @type data: bytes
+        @param names: Names of all assets in the folder.
+        @type names: set
+        @return: Content of stylesheet with fingerprinted references.
+        @rtype: bytes
+        """
+        directory = posixpath.dirname(name)
+
+        def replace(match):
+            reference = match.group(2).strip()
+            referenced = posixpath.normpath(
+                posixpath.join(directory, reference)
+            )
+
+            if referenced not in names or referenced == name:
+                return match.group(0)
+
+            fingerprinted = self._build_asset(
+                static_folder, referenced, names
+            )
+            return match.group(1) + posixpath.relpath(
+                fingerprinted, directory or "."
+            ) + match.group(3)
+
+        return CSS_REFERENCE.sub(replace, data.decode("utf-8")).encode("utf-8")
+
+
+def asset_url(filename):
+    """
+    Return the URL of a fingerprinted asset, falling back to the plain static
+    file if the asset is unknown.
+
+    @param filename: Name of asset relative to the static folder.
+    @type filename: str
+    @return: URL
+    @rtype: str
+    """
+    fingerprinted = current_app.extensions["assets"].url(filename)
+
+    if fingerprinted is None:
+        return url_for("static", filename=filename)
+
+    return url_for("assets.asset", filename=fingerprinted)
+
+
+@ASSETS.route('/assets/<path:filename>')
+def asset(filename):
+    """
+    Serve a fingerprinted asset in the best encoding the client accepts.
+    """
+    asset_ = current_app.extensions["assets"].assets.get(filename)
+
+    if asset_ is None:
+        abort(404)
+
+    encoding, data = asset_.negotiate(request.accept_encodings)
+    response = Response(data, mimetype=asset_.mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.cache_control.public = True
+    response.cache_control.max_age = ONE_YEAR
+    response.headers["Cache-Control"] += ", immutable"
+    return response
+
+
+def compress_response(response):
+    """
+    Compress HTML and JSON responses with gzip if the client accepts it. A
+    strong ETag becomes weak, since the compressed body differs byte by byte
+    from the uncompressed one. All of these responses vary by the accepted
+    encodings, also those that aren't compressed, so shared caches don't
+    serve one client's copy to the other.
+
+    @param response: Response to a request.
+    @type response: flask.Response
+    @return: Compressed response.
+    @rtype: flask.Response
+    """
+    if response.direct_passthrough or response.is_streamed or \
+            response.status_code not in (200, 304) or \
+            "Content-Encoding" in response.headers or \
+            response.mimetype not in ("text/html", "application/json"):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    if response.status_code != 200 or \
+            "gzip" not in request.accept_encodings:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config.get("COMPRESS_MIN_SIZE", 500):
+        return response
+
+    response.set_data(
+        gzip_compress(data, current_app.config.get("COMPRESS_LEVEL", 6))
+    )
+    response.headers["Content-Encoding"] = "gzip"
+
+    etag, is_weak = response.get_etag()
+    if etag is not None and not is_weak:
+        response.set_etag(etag, weak=True)
+
+    return response
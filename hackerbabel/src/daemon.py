@@ -6,18 +6,38 @@ translate them.
 """
 
 # STD
+import datetime
 import logging
 import json
-from time import sleep
+from time import sleep, time
 from threading import Thread
 
+# EXT
+from requests import exceptions
+
 # PROJECT
+from hackerbabel.cache import invalidate_story_pages
 from hackerbabel.clients.hackernews_client import HackerNewsClient
 from hackerbabel.clients.unbabel_client import UnbabelClient
 from hackerbabel.clients.mongodb_client import MongoDBClient
+from hackerbabel.src.events import event_broker
+from hackerbabel.src.metrics import registry
+from hackerbabel.src.resilience import backoff_delay
 
 # CONST
 LOGGER = logging.getLogger(__name__)
+CYCLE_SECONDS = registry.histogram(
+    "hackerbabel_refresh_cycle_seconds",
+    "Duration of the HackerNewsDaemon's refresh cycles.",
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+CYCLE_ITEMS = registry.gauge(
+    "hackerbabel_refresh_cycle_items",
+    "Stories and comments resolved in the last refresh cycle.",
+    labels=("type", )
+)
+# Translation statuses of titles that won't change anymore
+FINAL_TRANSLATION_STATUSES = ["done", "failed"]
 
 
 class SimpleDaemon(object):
@@ -34,7 +54,7 @@ class SimpleDaemon(object):
         @type daemon_args: tuple
         @param interval: Time interval between function executions.
         @type interval: int
-        @param daemonize: Daemonize thread. See UnbabelDaemon.
+        @param daemonize: Daemonize thread.
         @type daemonize: bool
         """
         self.daemon_func = daemon_func
@@ -58,11 +78,18 @@ class HackerNewsDaemon(SimpleDaemon):
     Daemon that retrieves the most recent Hacker News and creates threads to
     translate the titles.
     """
-    def __init__(self, interval, source_lang, target_langs, story_collection):
+    def __init__(self, interval, source_lang, target_langs, story_collection,
+                 comment_collection, scheduler, translation_memory,
+                 fragment_renderer, profiler=None):
         self.hn_client = HackerNewsClient()
         self.source_lang = source_lang
         self.target_langs = target_langs
         self.story_collection = story_collection
+        self.comment_collection = comment_collection
+        self.scheduler = scheduler
+        self.translation_memory = translation_memory
+        self.fragment_renderer = fragment_renderer
+        self.profiler = profiler
 
         super(HackerNewsDaemon, self).__init__(
             self.refresh_top_stories, tuple(), interval
@@ -75,50 +102,193 @@ class HackerNewsDaemon(SimpleDaemon):
         @param args: Argument of functions - in this case, none.
         @type args: tuple
         """
+        self.resume_translations()
+
         while True:
-            _ids = set()
-            for document in self.hn_client.get_top_stories():
-                title = document["titles"][self.source_lang]["title"]
-                story_id = document["id"]
-
-                # Check if story already exists -> maybe no need for
-                # translation / comment resolving
-                result = self.mdb_client.find_document(
-                    "id", story_id, self.story_collection, 1
-                )
-                if result:
-                    document["titles"] = result["titles"]
-                    if document["descendants"] == result["descendants"]:
-                        document["comments"] = result["comments"]
+            if self.profiler is not None and self.profiler.should_profile():
+                with self.profiler.profile("cycle"):
+                    self.refresh_cycle()
+            else:
+                self.refresh_cycle()
+
+            sleep(self.interval)
+
+    def resume_translations(self):
+        """
+        Schedule the translations that were unfinished at the last restart
+        again, i.e. those of all titles that are neither translated nor
+        failed. Titles waiting for a job that was already created reuse the
+        stored uid instead of submitting the title again; titles whose jobs
+        were still queued or hadn't been requested yet are submitted.
+        """
+        resumed = 0
+
+        for target_lang in self.target_langs:
+            stories = self.mdb_client.find_documents(
+                {
+                    "titles.{}.translation_status".format(target_lang): {
+                        "$nin": FINAL_TRANSLATION_STATUSES
+                    }
+                },
+                self.story_collection, projection={"id": True, "titles": True}
+            )
 
-                report = self.mdb_client.add_document(
-                    document, self.story_collection
+            for story in stories:
+                resumed += self.scheduler.schedule(UnbabelDaemon(
+                    self.interval, str(story["_id"]), story["id"],
+                    target_lang,
+                    story["titles"][self.source_lang]["title"],
+                    self.story_collection, self.translation_memory,
+                    self.fragment_renderer
+                ))
+
+        LOGGER.info("Resumed {} unfinished translation(s).".format(resumed))
+
+    def refresh_cycle(self):
+        """
+        Fetch the current top stories once, store them and start the
+        translation of new titles.
+        """
+        start_time = time()
+        refreshed = datetime.datetime.utcnow()
+        documents = self.hn_client.get_top_stories()
+        titles = {}
+        changed_comments = []
+        resolved_comments = 0
+
+        # Check which stories already exist -> maybe no need for
+        # translation / comment resolving
+        existing_stories = self.mdb_client.find_latest_documents(
+            "id", [document["id"] for document in documents],
+            self.story_collection,
+            ("descendants", "rank")
+        )
+
+        stories = {document["id"]: document for document in documents}
+        for story_id, document in stories.items():
+            titles[story_id] = document["titles"][self.source_lang]["title"]
+
+        # Fill in titles of new stories that were translated before
+        new_titles = [
+            titles[story_id] for story_id in titles
+            if story_id not in existing_stories
+        ]
+        for target_lang in self.target_langs:
+            translations = self.translation_memory.lookup(
+                new_titles, target_lang
+            )
+
+            for story_id, document in stories.items():
+                translation = translations.get(titles[story_id])
+
+                if story_id not in existing_stories and translation:
+                    document["titles"][target_lang] = {
+                        "title": translation,
+                        "translation_status": "done"
+                    }
+
+        comments_by_story = {}
+        for rank, document in enumerate(documents):
+            story_id = document["id"]
+            document["rank"] = rank
+            document["refreshed"] = refreshed
+            # Comments are stored in their own collection
+            comments = comments_by_story[story_id] = document.pop(
+                "comments", []
+            )
+            resolved_comments += len(comments)
+
+            result = existing_stories.get(story_id)
+
+            if not result or \
+                    document.get("descendants") != result.get("descendants"):
+                self.mdb_client.replace_comments(
+                    story_id, comments, self.comment_collection
+                )
+                changed_comments.append(story_id)
+
+        # Translations finishing in the meantime re-render their story's
+        # fragments under the same lock, so neither overwrites the other
+        with self.fragment_renderer.lock:
+            # Stored titles might have been translated since the cycle began
+            current_stories = self.mdb_client.find_latest_documents(
+                "id", list(existing_stories), self.story_collection,
+                ("titles", "fragments", "modified")
+            ) if existing_stories else {}
+
+            for document in documents:
+                result = current_stories.get(document["id"])
+
+                # Render with the stored titles, they might be translated
+                stored = dict(document, titles=result["titles"]) if result \
+                    else document
+                document["fragments"] = self.fragment_renderer.render_all(
+                    stored, comments_by_story[document["id"]]
                 )
 
-                if not result:
-                    _ids.add((str(report.inserted_id), title))
+                # Time the story's pages actually changed, for conditional
+                # requests
+                if result and \
+                        result.get("fragments") == document["fragments"] \
+                        and result.get("modified"):
+                    document["modified"] = result["modified"]
+                else:
+                    document["modified"] = refreshed
+
+            # Titles of existing stories are kept, they might already be
+            # translated
+            new_stories = self.mdb_client.upsert_documents(
+                documents, self.story_collection, "id",
+                insert_only_fields=("titles", )
+            )
 
-            # Start translation processes
-            for _id, title in _ids:
-                for target_lang in self.target_langs:
-                    ub_daemon = UnbabelDaemon(
-                        self.interval, _id, target_lang, title,
-                        self.story_collection
-                    )
-                    ub_daemon.run()
-            sleep(self.interval)
+        # Schedule translations of new titles
+        for story_id, _id in new_stories.items():
+            for target_lang in self.target_langs:
+                title_info = stories[story_id]["titles"][target_lang]
+
+                if title_info["translation_status"] == "done":
+                    continue
+
+                self.scheduler.schedule(UnbabelDaemon(
+                    self.interval, str(_id), story_id, target_lang,
+                    titles[story_id], self.story_collection,
+                    self.translation_memory, self.fragment_renderer
+                ))
+
+        # Ranks changed, so did the pages listing the stories
+        invalidate_story_pages(changed_comments)
+
+        if new_stories or any(
+                existing_stories[story_id].get("rank") != document["rank"]
+                for story_id, document in stories.items()
+                if story_id in existing_stories):
+            event_broker.publish("stories", {"refreshed": str(refreshed)})
+
+        CYCLE_SECONDS.observe(time() - start_time)
+        CYCLE_ITEMS.set(len(documents), type="stories")
+        CYCLE_ITEMS.set(resolved_comments, type="comments")
+
+        LOGGER.info(
+            "Translation scheduler: {queued} job(s) queued, {in_flight} in "
+            "flight on {workers} worker(s), {pending} waiting for their "
+            "translation.".format(
+                **self.scheduler.statistics()
+            )
+        )
 
 
-class UnbabelDaemon(SimpleDaemon):
+class UnbabelDaemon(object):
     """
-    Unbabel daemon that is called by HackerNewsDaemon and translates one
+    Unbabel job that is created by HackerNewsDaemon and translates one
     Hacker News story title into one target language.
 
-    @note: This is not technically a Daemon, just a regular thread. But it was
-    helpful letting this inherit from SimpleDaemon.
+    @note: This is not technically a Daemon, just a job executed by one of the
+    workers of the TranslationScheduler.
     """
-    def __init__(self, interval, document_id, target_language, title,
-                 story_collection):
+    def __init__(self, interval, document_id, story_id, target_language,
+                 title, story_collection, translation_memory=None,
+                 fragment_renderer=None):
         """
         Initializer.
 
@@ -126,82 +296,222 @@ class UnbabelDaemon(SimpleDaemon):
         @type interval: int
         @param document_id: MongoDB ID of document (_id)
         @type document_id: int
+        @param story_id: Hacker News story id.
+        @type story_id: int
         @param target_language: Language the text should be translated into.
         @type target_language: str or unicode
         @param title: News title to be translated.
         @type title: str or unicode.
+        @param translation_memory: Translation memory completed translations
+        are added to.
+        @type translation_memory: TranslationMemory or None
+        @param fragment_renderer: Renderer updating the story's fragments when
+        its translation status changes.
+        @type fragment_renderer: FragmentRenderer or None
         """
         self.ub_client = UnbabelClient()
+        self.mdb_client = MongoDBClient()
+        self.interval = interval
+        self.document_id = document_id
+        self.story_id = story_id
+        self.target_language = target_language
         self.title = title
         self.story_collection = story_collection
+        self.translation_memory = translation_memory
+        self.fragment_renderer = fragment_renderer
 
-        logging.info(
-            u"New thread trying to translate '{title}' into {lang}".format(
-                title=self.title, lang=target_language
-            )
-        )
+    @property
+    def key(self):
+        """
+        Identify the translation, so it isn't requested twice at the same time.
 
-        # Do initial request
-        response = None
-        status_code = 404
-        while status_code != 201 and status_code != 200:
-            response = self.ub_client.make_translation_request(
-                self.title, target_language
-            )
-            status_code = response.status_code
+        @return: MongoDB ID of the story document and target language.
+        @rtype: tuple
+        """
+        return self.document_id, self.target_language
 
-        response_data = json.loads(response.content)
-        uid = response_data["uid"]
+    @property
+    def idempotency_key(self):
+        """
+        Identify the submissions of the translation to the Unbabel API, so
+        resubmitting it after a timeout doesn't create a second job.
 
-        super(UnbabelDaemon, self).__init__(
-            self.translate_title, (uid, document_id, target_language),
-            interval,
-            daemonize=False
-        )
+        @return: Key derived from the MongoDB ID of the story document and
+        the target language.
+        @rtype: str
+        """
+        return "{}-{}".format(*self.key)
 
-    def translate_title(self, uid, document_id, target_language):
+    def submit(self):
         """
-        Translate a story title.
+        Request the translation of the title. The result is collected later by
+        the TranslationPoller.
 
-        @param uid: Unique Unbabel API job idea.
-        @type uid: str or unicode
-        @param document_id: MongoDB ID of document (_id)
-        @type document_id: int
-        @param target_language: Language the text should be translated into.
-        @type target_language: str or unicode
+        Failed requests are retried with exponential backoff and pause while
+        the API's circuit breaker is open. The job uid is stored with the
+        story, so a job that was already created is never submitted again.
+        Requests that time out after being sent might have created the job
+        anyway, so every submission carries the same idempotency key.
+
+        @return: Unique Unbabel API job id or None if the request failed.
+        @rtype: str or unicode or None
         """
-        response_data = None
-        status = "new"
+        story = self.mdb_client.find_document(
+            "_id", self.document_id, self.story_collection
+        )
+        title_info = (story or {}).get("titles", {}).get(
+            self.target_language, {}
+        )
 
-        self._change_story_translation_status(
-            document_id, target_language, "pending"
+        if title_info.get("translation_status") == "done":
+            return None
+
+        if self.translation_memory is not None:
+            translation = self.translation_memory.get(
+                self.title, self.target_language
+            )
+
+            # Translated by another job in the meantime
+            if translation is not None:
+                self._add_translated_story_title(
+                    self.document_id, self.target_language, translation
+                )
+                self._change_story_translation_status(
+                    self.document_id, self.target_language, "done"
+                )
+                return None
+
+        if title_info.get("uid"):
+            LOGGER.info(
+                u"Translation of '{title}' into {lang} was already "
+                u"requested.".format(
+                    title=self.title, lang=self.target_language
+                )
+            )
+            return title_info["uid"]
+
+        logging.info(
+            u"Trying to translate '{title}' into {lang}".format(
+                title=self.title, lang=self.target_language
+            )
         )
 
-        # Check translation status
-        while status != "completed":
-            sleep(self.interval/10.0)
-            response = self.ub_client.check_translation_status(uid)
-            response_data = json.loads(response.content)
-            status = response_data["status"]
+        circuit_breaker = self.ub_client.circuit_breaker
+        for attempt in range(self.ub_client.max_retries + 1):
+            if attempt > 0:
+                sleep(backoff_delay(
+                    attempt - 1, self.ub_client.retry_base_delay,
+                    self.ub_client.retry_max_delay
+                ))
 
-        translated_text = response_data["translatedText"]
+            circuit_breaker.wait()
 
+            try:
+                response = self.ub_client.make_translation_request(
+                    self.title, self.target_language,
+                    idempotency_key=self.idempotency_key
+                )
+            except exceptions.ConnectionError as exception:
+                # Includes timeouts while connecting, nothing was sent yet
+                circuit_breaker.record_failure()
+                LOGGER.warning(
+                    "Couldn't reach Unbabel API: {}".format(repr(exception))
+                )
+                continue
+            except exceptions.Timeout as exception:
+                # The job might have been created, the idempotency key keeps
+                # the retry from creating another one
+                circuit_breaker.record_failure()
+                LOGGER.warning(
+                    "Unbabel API didn't respond in time: {}".format(
+                        repr(exception)
+                    )
+                )
+                continue
+            except Exception:
+                # Unexpected errors mustn't leave a trial request unanswered
+                circuit_breaker.record_failure()
+                raise
+
+            if response.status_code in (200, 201):
+                try:
+                    uid = json.loads(response.content)["uid"]
+                except (ValueError, KeyError):
+                    circuit_breaker.record_failure()
+                    raise
+                circuit_breaker.record_success()
+
+                self._change_story_translation_status(
+                    self.document_id, self.target_language, "pending",
+                    extra_updates={
+                        "titles.{}.uid".format(self.target_language): uid
+                    }
+                )
+                return uid
+
+            if response.status_code == 429 or response.status_code >= 500:
+                circuit_breaker.record_failure()
+                LOGGER.warning(
+                    "Unbabel API responded with status {}.".format(
+                        response.status_code
+                    )
+                )
+                continue
+
+            # The API works, but rejects the request
+            circuit_breaker.record_success()
+            self.fail("rejected ({})".format(response.status_code))
+            return None
+
+        self.fail("unreachable")
+        return None
+
+    def complete(self, translated_text):
+        """
+        Store the completed translation of the title.
+
+        @param translated_text: Translated title.
+        @type translated_text: str or unicode
+        """
         logging.info(
             u"Translation complete!\n'{title}' --({lang})--> '{transtitle}'".format(
-                title=self.title, lang=target_language,
+                title=self.title, lang=self.target_language,
                 transtitle=translated_text
             )
         )
 
+        self._add_translated_story_title(
+            self.document_id, self.target_language, translated_text
+        )
         self._change_story_translation_status(
-            document_id, target_language, "done"
+            self.document_id, self.target_language, "done"
         )
-        self._add_translated_story_title(
-            document_id, target_language, translated_text
+
+        if self.translation_memory is not None:
+            self.translation_memory.put(
+                self.title, self.target_language, translated_text
+            )
+
+    def fail(self, status):
+        """
+        Mark the translation of the title as failed.
+
+        @param status: Final status of the Unbabel API job.
+        @type status: str or unicode
+        """
+        logging.warning(
+            u"Translation of '{title}' into {lang} ended with status "
+            u"'{status}'.".format(
+                title=self.title, lang=self.target_language, status=status
+            )
+        )
+
+        self._change_story_translation_status(
+            self.document_id, self.target_language, "failed"
         )
 
     def _change_story_translation_status(self, document_id, language,
-                                         new_status):
+                                         new_status, extra_updates=None):
         """
         Change the translation status of a story title.
 
@@ -211,15 +521,27 @@ class UnbabelDaemon(SimpleDaemon):
         @type language: str or unicode
         @param new_status: New translation status.
         @type new_status: str or unicode
+        @param extra_updates: Further fields set in the same update, e.g. the
+        job uid.
+        @type extra_updates: dict or None
         """
+        updates = {
+            "titles.{}.translation_status".format(language): new_status
+        }
+        updates.update(extra_updates or {})
         self.mdb_client.update_document(
-            self.story_collection,
-            document_id,
-            updates={
-                "titles.{}.translation_status".format(language): new_status
-            }
+            self.story_collection, document_id, updates=updates
         )
 
+        if self.fragment_renderer is not None:
+            self.fragment_renderer.update_story(
+                self.story_collection, document_id
+            )
+        invalidate_story_pages()
+        event_broker.publish("translation", {
+            "story_id": self.story_id, "lang": language, "status": new_status
+        })
+
     def _add_translated_story_title(self, document_id, language,
                                     translated_title):
         """
@@ -239,3 +561,13 @@ class UnbabelDaemon(SimpleDaemon):
                 "titles.{}.title".format(language): translated_title
             }
         )
+        event = {
+            "story_id": self.story_id, "lang": language,
+            "title": translated_title
+        }
+        if self.fragment_renderer is not None:
+            # Shown as is, so the dashboard doesn't need its own rule
+            event["display_title"] = self.fragment_renderer.dashboard_title(
+                translated_title
+            )
+        event_broker.publish("translation", event)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Broker pushing changes to open pages as server-sent events, so pages can
+update themselves instead of being reloaded.
+"""
+
+# STD
+from collections import deque
+import json
+from threading import Lock
+
+try:
+    from Queue import Empty, Full, Queue  # Python 2
+except ImportError:
+    from queue import Empty, Full, Queue
+
+# PROJECT
+from hackerbabel.src.metrics import registry
+
+
+class EventBroker(object):
+    """
+    Publish / subscribe hub for events inside one process. Every subscriber
+    gets its own bounded queue, so a slow client only loses its own events.
+    The most recent events are kept, so clients reconnecting with the ID of the
+    last event they received don't miss anything in between.
+    """
+    def __init__(self, history_size=100, queue_size=100):
+        """
+        Initializer.
+
+        @param history_size: Number of recent events kept for reconnecting
+        clients.
+        @type history_size: int
+        @param queue_size: Maximum number of events waiting for one subscriber.
+        @type queue_size: int
+        """
+        self.queue_size = queue_size
+        self.history = deque(maxlen=history_size)
+        self.subscribers = set()
+        self.lock = Lock()
+        self.last_id = 0
+        self.dropped = 0
+
+    def publish(self, event, data):
+        """
+        Send an event to all subscribers.
+
+        @param event: Type of event, e.g. "translation".
+        @type event: str
+        @param data: Event data, has to be serializable as JSON.
+        @type data: dict
+        """
+        with self.lock:
+            self.last_id += 1
+            message = format_event(self.last_id, event, data)
+            self.history.append((self.last_id, message))
+            subscribers = list(self.subscribers)
+
+        for queue in subscribers:
+            try:
+                queue.put_nowait(message)
+            except Full:
+                with self.lock:
+                    self.dropped += 1
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a new subscriber.
+
+        @param last_event_id: ID of the last event a reconnecting client
+        received, newer events are delivered again.
+        @type last_event_id: int or None
+        @return: Queue the subscriber receives formatted events from.
+        @rtype: Queue
+        """
+        queue = Queue(self.queue_size)
+
+        with self.lock:
+            if last_event_id is not None:
+                for event_id, message in self.history:
+                    if event_id > last_event_id:
+                        queue.put_nowait(message)
+            self.subscribers.add(queue)
+
+        return queue
+
+    def unsubscribe(self, queue):
+        """
+        Remove a subscriber.
+
+        @param queue: Queue returned by subscribe().
+        @type queue: Queue
+        """
+        with self.lock:
+            self.subscribers.discard(queue)
+
+    def stream(self, last_event_id=None, keepalive=15):
+        """
+        Generate the body of an event stream response for one client. Sends a
+        comment if there were no events for a while, so connections aren't
+        closed by proxies and disconnected clients are noticed.
+
+        @param last_event_id: ID of the last event a reconnecting client
+        received.
+        @type last_event_id: int or None
+        @param keepalive: Time in seconds between messages.
+        @type keepalive: float
+        @return: Generator of formatted events.
+        @rtype: generator
+        """
+        queue = self.subscribe(last_event_id)
+
+        try:
+            while True:
+                try:
+                    yield queue.get(timeout=keepalive)
+                except Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    def statistics(self):
+        """
+        Return the broker's counters.
+
+        @return: Number of subscribers, events published and events dropped.
+        @rtype: dict
+        """
+        with self.lock:
+            return {
+                "subscribers": len(self.subscribers),
+                "published": self.last_id,
+                "dropped": self.dropped
+            }
+
+
+def format_event(event_id, event, data):
+    """
+    Format an event for an event stream.
+
+    @param event_id: Consecutive ID of the event.
+    @type event_id: int
+    @param event: Type of event.
+    @type event: str
+    @param data: Event data, has to be serializable as JSON.
+    @type data: dict
+    @return: Formatted event.
+    @rtype: str
+    """
+    return "id: {}\nevent: {}\ndata: {}\n\n".format(
+        event_id, event, json.dumps(data)
+    )
+
+
+event_broker = EventBroker()
+
+registry.gauge(
+    "hackerbabel_event_subscribers", "Clients receiving server-sent events.",
+    function=lambda: event_broker.statistics()["subscribers"]
+)
+registry.counter(
+    "hackerbabel_events_dropped_total",
+    "Events not delivered because a client's queue was full.",
+    function=lambda: event_broker.statistics()["dropped"]
+)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""
+HTML fragments rendered when stories are written instead of when pages are
+requested, so pages only have to put together the stored fragments.
+"""
+
+# STD
+import datetime
+import hashlib
+from threading import Lock
+
+# EXT
+from markupsafe import Markup
+
+# PROJECT
+from hackerbabel.clients.mongodb_client import MongoDBClient
+
+# CONST
+STORY_FRAGMENTS = {
+    "index": "fragments/index_story.html",
+    "dashboard": "fragments/dashboard_story.html"
+}
+COMMENTS_FRAGMENT = "fragments/comments.html"
+DASHBOARD_TITLE_LENGTH = 75  # Longer titles are cut off on the dashboard
+
+
+class FragmentRenderer(object):
+    """
+    Render the fragments of a story: Its row on the index page and on the
+    dashboard, as well as the first page of its comment section. Fragments are
+    stamped with a version derived from the fragment templates, so fragments
+    rendered with an older template are rendered again when needed.
+    """
+    def __init__(self, jinja_env, source_lang, comments_per_page):
+        """
+        Initializer.
+
+        @param jinja_env: Jinja environment of the app.
+        @type jinja_env: jinja2.Environment
+        @param source_lang: Language titles are translated from.
+        @type source_lang: str or unicode
+        @param comments_per_page: Number of top level comments on one page.
+        @type comments_per_page: int
+        """
+        self.jinja_env = jinja_env
+        self.source_lang = source_lang
+        self.comments_per_page = comments_per_page
+        self.mdb_client = MongoDBClient()
+        self.lock = Lock()
+        jinja_env.filters["dashboard_title"] = self.dashboard_title
+
+        version = hashlib.sha1()
+        for template in sorted(STORY_FRAGMENTS.values()) + [COMMENTS_FRAGMENT]:
+            source, _, _ = jinja_env.loader.get_source(jinja_env, template)
+            version.update(source.encode("utf-8"))
+        self.version = version.hexdigest()[:12]
+
+    def dashboard_title(self, title):
+        """
+        Shorten a title the way the dashboard shows it. Used by the dashboard
+        fragment as well as for titles sent to the dashboard as events, so
+        both are cut off the same way.
+
+        @param title: Title.
+        @type title: str or unicode
+        @return: Title, cut off with "..." if it's too long.
+        @rtype: str or unicode
+        """
+        return self.jinja_env.call_filter(
+            "truncate", title, [DASHBOARD_TITLE_LENGTH, True]
+        )
+
+    def render_story(self, story):
+        """
+        Render the fragments showing a story on the index page and on the
+        dashboard.
+
+        @param story: Story.
+        @type story: dict
+        @return: Fragments by page.
+        @rtype: dict
+        """
+        return {
+            page: self.jinja_env.get_template(template).render(
+                story=story, source=self.source_lang
+            )
+            for page, template in STORY_FRAGMENTS.items()
+        }
+
+    def render_comments(self, story, comments, total):
+        """
+        Render the first page of a story's comment section.
+
+        @param story: Story.
+        @type story: dict
+        @param comments: Top level comments on the first page.
+        @type comments: list
+        @param total: Total number of top level comments.
+        @type total: int
+        @return: Fragment.
+        @rtype: unicode
+        """
+        return self.jinja_env.get_template(COMMENTS_FRAGMENT).render(
+            story=story, comments=comments, total=total,
+            per_page=self.comments_per_page
+        )
+
+    def render_all(self, story, comments):
+        """
+        Render all fragments of a story, to be stored as the story's
+        "fragments" field.
+
+        @param story: Story.
+        @type story: dict
+        @param comments: All comments of the story, see
+        HackerNewsClient.resolve_comment_ids().
+        @type comments: list
+        @return: Fragments by page together with their version.
+        @rtype: dict
+        """
+        top_level = sorted(
+            [comment for comment in comments if comment["depth"] == 0],
+            key=lambda comment: comment["rank"]
+        )
+        fragments = self.render_story(story)
+        fragments["comments"] = self.render_comments(
+            story, top_level[:self.comments_per_page], len(top_level)
+        )
+        fragments["version"] = self.version
+        return fragments
+
+    def update_story(self, story_collection, document_id):
+        """
+        Render the fragments of a stored story again after its translations
+        changed and mark it as modified. The comment section is left
+        untouched.
+
+        @param story_collection: Name of the collection the stories are stored
+        in.
+        @type story_collection: str or unicode
+        @param document_id: MongoDB ID of document (_id)
+        @type document_id: str or unicode
+        """
+        # Serialized, so the last write always sees all preceding changes
+        with self.lock:
+            story = self.mdb_client.find_document(
+                "_id", document_id, story_collection
+            )
+
+            if story is None:
+                return
+
+            updates = {
+                "fragments.{}".format(page): fragment
+                for page, fragment in self.render_story(story).items()
+            }
+            if story.get("fragments", {}).get("version") != self.version:
+                # Comment section has to be rendered on demand
+                updates["fragments.comments"] = None
+            updates["fragments.version"] = self.version
+            updates["modified"] = datetime.datetime.utcnow()
+
+            self.mdb_client.update_document(
+                story_collection, document_id, updates
+            )
+
+    def story_fragments(self, stories, page):
+        """
+        Collect the fragments of stories for a page. Missing or outdated
+        fragments are rendered on the spot.
+
+        @param stories: Stories.
+        @type stories: list
+        @param page: Page the fragments are shown on, "index" or "dashboard".
+        @type page: str
+        @return: Fragments in the order of the stories.
+        @rtype: list
+        """
+        fragments = []
+
+        for story in stories:
+            stored = story.get("fragments") or {}
+
+            if stored.get("version") == self.version and stored.get(page):
+                fragments.append(Markup(stored[page]))
+            else:
+                fragments.append(Markup(self.render_story(story)[page]))
+
+        return fragments
+
+    def comments_fragment(self, story, load_comments):
+        """
+        Return the stored first page of a story's comment section or render it
+        on the spot if it's missing or outdated.
+
+        @param story: Story or None.
+        @type story: dict or None
+        @param load_comments: Function returning the top level comments of the
+        first page and their total number, if they have to be rendered.
+        @type load_comments: func
+        @return: Fragment.
+        @rtype: Markup
+        """
+        stored = (story or {}).get("fragments") or {}
+
+        if stored.get("version") == self.version and stored.get("comments"):
+            return Markup(stored["comments"])
+
+        comments, total = load_comments() if story else ([], 0)
+        return Markup(self.render_comments(story, comments, total))
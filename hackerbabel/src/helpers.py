@@ -21,25 +21,130 @@ def check_and_create_directory(directory):
         os.makedirs(directory)
 
 
-def get_story(story_id, story_collection):
+def get_story(story_id, story_collection, comment_collection=None):
     """
-    Retrieve a specific story form the database via its Hacker News story id.
+    Retrieve a specific story form the database via its Hacker News story id,
+    optionally together with its whole comment tree.
 
     @param story_id: Hacker News story id.
     @type story_id: int
     @param story_collection: Name of the collections the stories are stored in.
     @type story_collection: str or unicode
+    @param comment_collection: Name of the collection the comments are stored
+    in. If given, the comment tree is added to the story.
+    @type comment_collection: str or unicode or None
     @return: Story
     @rtype: dict
     """
     from hackerbabel.clients.mongodb_client import MongoDBClient
-    from hackerbabel.clients.hackernews_client import HackerNewsClient
 
     mdb_client = MongoDBClient()
     story = mdb_client.find_document("id", story_id, story_collection)
+
+    if story and comment_collection:
+        story["comments"] = build_comment_tree(
+            mdb_client.find_documents(
+                {"story_id": story_id}, comment_collection,
+                sort=[("depth", 1), ("rank", 1)]
+            ),
+            story_id
+        )
+
     return story
 
 
+def get_comment_page(story_id, comment_collection, page, per_page):
+    """
+    Retrieve one page of the top level comments of a story, without replies.
+
+    @param story_id: Hacker News story id.
+    @type story_id: int
+    @param comment_collection: Name of the collection the comments are stored
+    in.
+    @type comment_collection: str or unicode
+    @param page: Number of page, starting at 1.
+    @type page: int
+    @param per_page: Number of comments per page.
+    @type per_page: int
+    @return: Comments on this page and total number of top level comments.
+    @rtype: tuple
+    """
+    from hackerbabel.clients.mongodb_client import MongoDBClient
+
+    mdb_client = MongoDBClient()
+    query = {"story_id": story_id, "depth": 0}
+    comments = mdb_client.find_documents(
+        query, comment_collection, sort=[("depth", 1), ("rank", 1)],
+        skip=(page - 1) * per_page, limit=per_page, projection={"_id": False}
+    )
+    return comments, mdb_client.count_documents(query, comment_collection)
+
+
+def get_comment_subtree(story_id, comment_id, comment_collection):
+    """
+    Retrieve all replies to a comment as a tree.
+
+    @param story_id: Hacker News story id.
+    @type story_id: int
+    @param comment_id: Hacker News comment id.
+    @type comment_id: int
+    @param comment_collection: Name of the collection the comments are stored
+    in.
+    @type comment_collection: str or unicode
+    @return: Replies to the comment or None if the comment doesn't exist.
+    @rtype: list or None
+    """
+    from hackerbabel.clients.mongodb_client import MongoDBClient
+
+    mdb_client = MongoDBClient()
+    comment = mdb_client.find_document("id", comment_id, comment_collection)
+
+    if not comment or comment["story_id"] != story_id:
+        return None
+
+    # All replies belong to the same thread but are deeper in the tree
+    thread = mdb_client.find_documents(
+        {
+            "story_id": story_id, "thread": comment["thread"],
+            "depth": {"$gt": comment["depth"]}
+        },
+        comment_collection, sort=[("depth", 1), ("rank", 1)],
+        projection={"_id": False}
+    )
+    return build_comment_tree(thread, comment_id)
+
+
+def build_comment_tree(comments, parent_id):
+    """
+    Rebuild (a part of) the comment tree of a story from its comment
+    documents.
+
+    @param comments: Comment documents sorted by depth and rank.
+    @type comments: list
+    @param parent_id: ID of the story or comment that is the root of the tree.
+    @type parent_id: int
+    @return: Replies to the root, replies to a comment are listed under
+    "replies".
+    @rtype: list
+    """
+    tree = []
+    nodes = {}
+
+    for comment in comments:
+        if comment["parent"] == parent_id:
+            siblings = tree
+        elif comment["parent"] in nodes:
+            siblings = nodes[comment["parent"]]["replies"]
+        else:
+            continue  # Not part of this tree
+
+        node = dict(comment, replies=[])
+        nodes[comment["id"]] = node
+        siblings.append(node)
+
+    return tree
+
+
 def get_stories(story_collection):
     """
     Get the stories that should be rendered on the starting page.
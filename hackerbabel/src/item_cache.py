@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bounded in-process caches used to avoid fetching the same data again and
+again.
+"""
+
+# STD
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+def age_based_ttl(item, now=None, min_ttl=60, max_ttl=86400, age_factor=0.1):
+    """
+    Determine how long a Hacker News item can be cached. The older an item is,
+    the less likely it is to change, so the time to live is a fraction of the
+    item's age, clamped between a minimum and a maximum.
+
+    @param item: Hacker News item.
+    @type item: dict
+    @param now: Current time as UNIX timestamp.
+    @type now: float or None
+    @param min_ttl: Minimum time to live in seconds.
+    @type min_ttl: int
+    @param max_ttl: Maximum time to live in seconds.
+    @type max_ttl: int
+    @param age_factor: Fraction of the item's age used as time to live.
+    @type age_factor: float
+    @return: Time to live in seconds.
+    @rtype: float
+    """
+    now = time.time() if now is None else now
+    age = max(now - item.get("time", now), 0)
+    return min(max(age * age_factor, min_ttl), max_ttl)
+
+
+class LRUCache(object):
+    """
+    Thread-safe cache with a maximum size that evicts the least recently used
+    entry when full. Keeps count of hits, misses and evictions.
+    """
+    def __init__(self, max_size):
+        """
+        Initializer.
+
+        @param max_size: Maximum number of entries.
+        @type max_size: int
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Look up an entry and mark it as recently used.
+
+        @param key: Key of entry.
+        @type key: object
+        @return: Cached value or None
+        @rtype: object or None
+        """
+        with self.lock:
+            value = self.entries.pop(key, None)
+
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.entries[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Add or replace an entry, evicting the least recently used entries if
+        the cache is full.
+
+        @param key: Key of entry.
+        @type key: object
+        @param value: Value to be cached (None can't be cached).
+        @type value: object
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Remove an entry if it exists.
+
+        @param key: Key of entry.
+        @type key: object
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def statistics(self):
+        """
+        Return the cache's counters.
+
+        @return: Size, hits, misses, evictions and hit ratio.
+        @rtype: dict
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / float(lookups) if lookups else 0.0
+            }
+
+
+class ItemCache(LRUCache):
+    """
+    LRU cache for Hacker News items whose entries expire, see age_based_ttl().
+    """
+    def __init__(self, max_size, min_ttl=60, max_ttl=86400, age_factor=0.1):
+        """
+        Initializer.
+
+        @param max_size: Maximum number of items.
+        @type max_size: int
+        @param min_ttl: Minimum time to live in seconds.
+        @type min_ttl: int
+        @param max_ttl: Maximum time to live in seconds.
+        @type max_ttl: int
+        @param age_factor: Fraction of the item's age used as time to live.
+        @type age_factor: float
+        """
+        super(ItemCache, self).__init__(max_size)
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.age_factor = age_factor
+        self.expirations = 0
+
+    def ttl(self, item, now=None):
+        """
+        Determine how long an item can be cached.
+
+        @param item: Hacker News item.
+        @type item: dict
+        @param now: Current time as UNIX timestamp.
+        @type now: float or None
+        @return: Time to live in seconds.
+        @rtype: float
+        """
+        return age_based_ttl(
+            item, now, self.min_ttl, self.max_ttl, self.age_factor
+        )
+
+    def get(self, key):
+        """
+        Look up an item. Expired items are removed and count as misses.
+
+        @param key: Item ID.
+        @type key: int
+        @return: Item or None
+        @rtype: dict or None
+        """
+        entry = super(ItemCache, self).get(key)
+
+        if entry is None:
+            return None
+
+        item, expires = entry
+        if time.time() >= expires:
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+                self.hits -= 1
+                self.misses += 1
+                self.expirations += 1
+            return None
+
+        return item
+
+    def set(self, key, value, fetched=None):
+        """
+        Cache an item.
+
+        @param key: Item ID.
+        @type key: int
+        @param value: Item.
+        @type value: dict
+        @param fetched: Time the item was fetched as UNIX timestamp, defaults to
+        now.
+        @type fetched: float or None
+        """
+        fetched = time.time() if fetched is None else fetched
+        super(ItemCache, self).set(
+            key, (value, fetched + self.ttl(value, fetched))
+        )
+
+    def statistics(self):
+        """
+        Return the cache's counters.
+
+        @return: Size, hits, misses, evictions, expirations and hit ratio.
+        @rtype: dict
+        """
+        statistics = super(ItemCache, self).statistics()
+        statistics["expirations"] = self.expirations
+        return statistics
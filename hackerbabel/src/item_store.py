@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent local store for Hacker News items, so fetched items survive
+restarts of the application.
+
+New items are buffered and written in one transaction when the store is
+flushed, e.g. after every batch of items, instead of committing every single
+item.
+"""
+
+# STD
+import json
+import os
+import sqlite3
+from threading import Lock
+import time
+
+# PROJECT
+from hackerbabel.src.helpers import check_and_create_directory
+
+
+class ItemStore(object):
+    """
+    SQLite database of Hacker News items keyed by their item ID, together with
+    the time they were fetched.
+    """
+    def __init__(self, path, max_age=None):
+        """
+        Initializer.
+
+        @param path: Path to the database file.
+        @type path: str or unicode
+        @param max_age: Time in seconds after which items are removed by
+        prune() or None to keep them forever.
+        @type max_age: int or None
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            check_and_create_directory(directory)
+
+        self.path = path
+        self.max_age = max_age
+        self.pending = {}
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "id INTEGER PRIMARY KEY, item TEXT NOT NULL, fetched REAL NOT NULL"
+            ")"
+        )
+        self.connection.commit()
+
+    def get(self, item_id):
+        """
+        Look up an item.
+
+        @param item_id: ID of item.
+        @type item_id: int
+        @return: Item and the time it was fetched as UNIX timestamp or None if
+        the item isn't stored.
+        @rtype: tuple or None
+        """
+        with self.lock:
+            row = self.pending.get(item_id)
+
+            if row is None:
+                row = self.connection.execute(
+                    "SELECT item, fetched FROM items WHERE id = ?",
+                    (item_id, )
+                ).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0]), row[1]
+
+    def put(self, item_id, item, fetched=None):
+        """
+        Store an item, replacing an older version. The item is only written
+        to the database by the next flush().
+
+        @param item_id: ID of item.
+        @type item_id: int
+        @param item: Hacker News item.
+        @type item: dict
+        @param fetched: Time the item was fetched as UNIX timestamp, defaults
+        to now.
+        @type fetched: float or None
+        """
+        fetched = time.time() if fetched is None else fetched
+
+        with self.lock:
+            self.pending[item_id] = (json.dumps(item), fetched)
+
+    def flush(self):
+        """
+        Write all items stored since the last flush in one transaction.
+
+        @return: Number of written items.
+        @rtype: int
+        """
+        with self.lock:
+            if not self.pending:
+                return 0
+
+            rows = [
+                (item_id, item, fetched)
+                for item_id, (item, fetched) in self.pending.items()
+            ]
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO items (id, item, fetched) "
+                "VALUES (?, ?, ?)", rows
+            )
+            self.connection.commit()
+            self.pending.clear()
+
+        return len(rows)
+
+    def prune(self, now=None):
+        """
+        Remove items fetched longer than max_age seconds ago.
+
+        @param now: Current time as UNIX timestamp, defaults to now.
+        @type now: float or None
+        @return: Number of removed items.
+        @rtype: int
+        """
+        if self.max_age is None:
+            return 0
+
+        now = time.time() if now is None else now
+
+        with self.lock:
+            removed = self.connection.execute(
+                "DELETE FROM items WHERE fetched < ?", (now - self.max_age, )
+            ).rowcount
+            self.connection.commit()
+
+        return removed
+
+    def __len__(self):
+        self.flush()
+
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM items"
+            ).fetchone()[0]
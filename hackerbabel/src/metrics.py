@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+
+"""
+Registry of counters, gauges and histograms describing the whole pipeline,
+exposed on /metrics in the text format of Prometheus.
+
+Updating a metric only takes a lock and changes a number, so metrics can be
+updated on hot paths. Metrics reporting the state of another component (e.g.
+the page cache) are computed by a function when they are exposed instead.
+"""
+
+# STD
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from numbers import Integral
+from threading import active_count, Lock
+import time
+
+# CONST
+# Upper bounds of histogram buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Metric(object):
+    """
+    Metric with a value per combination of label values.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        """
+        Initializer.
+
+        @param name: Name of metric, e.g. "hackerbabel_requests_total".
+        @type name: str
+        @param documentation: Description of metric.
+        @type documentation: str
+        @param labels: Names of labels.
+        @type labels: tuple
+        @param function: Function returning the current value of the metric
+        or its values by label values (as tuple), replaces the stored values.
+        @type function: func or None
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.function = function
+        self.values = {}
+        self.lock = Lock()
+
+    def set_function(self, function):
+        """
+        Compute the metric with a function when it's exposed.
+
+        @param function: Function returning the current value of the metric
+        or its values by label values (as tuple).
+        @type function: func
+        """
+        self.function = function
+
+    def samples(self):
+        """
+        Return the current samples of the metric.
+
+        @return: Samples as name suffix, labels and value.
+        @rtype: list
+        """
+        if self.function is not None:
+            values = self.function()
+            if isinstance(values, dict):
+                values = {
+                    tuple(str(label) for label in label_values): value
+                    for label_values, value in values.items()
+                }
+            else:
+                values = {(): values}
+        else:
+            with self.lock:
+                values = dict(self.values)
+
+        return [
+            ("", dict(zip(self.labels, label_values)), value)
+            for label_values, value in sorted(values.items())
+        ]
+
+    def _key(self, labels):
+        """
+        Create the key of the value belonging to some label values.
+
+        @param labels: Label values by label name.
+        @type labels: dict
+        @return: Label values as strings, in the order of the metric's
+        labels.
+        @rtype: tuple
+        @raise KeyError: If the value of a label is missing.
+        """
+        # Values of different types (e.g. status codes and "error") have to
+        # be sortable together
+        return tuple(str(labels[label]) for label in self.labels)
+
+
+class Counter(Metric):
+    """
+    Metric that only increases, e.g. the number of requests.
+    """
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the counter.
+
+        @param amount: Amount the counter is increased by.
+        @type amount: int or float
+        @param labels: Label values.
+        @type labels: dict
+        """
+        key = self._key(labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Metric that can go up and down, e.g. the number of queued jobs.
+    """
+    type = "gauge"
+
+    def set(self, value, **labels):
+        """
+        Set the gauge.
+
+        @param value: New value.
+        @type value: int or float
+        @param labels: Label values.
+        @type labels: dict
+        """
+        key = self._key(labels)
+
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    """
+    Metric counting observations, e.g. durations, in buckets.
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        """
+        Initializer.
+
+        @param name: Name of metric, e.g. "hackerbabel_request_seconds".
+        @type name: str
+        @param documentation: Description of metric.
+        @type documentation: str
+        @param labels: Names of labels.
+        @type labels: tuple
+        @param buckets: Upper bounds of buckets in ascending order.
+        @type buckets: tuple
+        """
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        """
+        Add an observation.
+
+        @param value: Observed value.
+        @type value: int or float
+        @param labels: Label values.
+        @type labels: dict
+        """
+        key = self._key(labels)
+        # Only one bucket is counted, buckets are accumulated when exposed
+        bucket = bisect_left(self.buckets, value)
+
+        with self.lock:
+            observations = self.values.get(key)
+            if observations is None:
+                observations = self.values[key] = [
+                    [0] * (len(self.buckets) + 1), 0, 0
+                ]
+            observations[0][bucket] += 1
+            observations[1] += value
+            observations[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of a block in seconds.
+
+        @param labels: Label values.
+        @type labels: dict
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start_time, **labels)
+
+    def samples(self):
+        """
+        Return the current samples of the histogram: The accumulated count of
+        every bucket, the sum and the number of observations per combination
+        of label values.
+
+        @return: Samples as name suffix, labels and value.
+        @rtype: list
+        """
+        with self.lock:
+            values = {
+                key: (list(counts), total, number)
+                for key, (counts, total, number) in self.values.items()
+            }
+
+        samples = []
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+
+        for label_values, (counts, total, number) in sorted(values.items()):
+            labels = dict(zip(self.labels, label_values))
+            accumulated = 0
+
+            for bound, bucket_count in zip(bounds, counts):
+                accumulated += bucket_count
+                samples.append(
+                    ("_bucket", dict(labels, le=bound), accumulated)
+                )
+
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, number))
+
+        return samples
+
+
+class MetricsRegistry(object):
+    """
+    All metrics of the process.
+    """
+    def __init__(self):
+        """
+        Initializer, the registry starts without metrics.
+        """
+        self.metrics = []
+        self.names = set()
+        self.lock = Lock()
+
+    def counter(self, name, documentation, labels=(), function=None):
+        """
+        Create and register a counter, see Metric.
+        """
+        return self.register(Counter(name, documentation, labels, function))
+
+    def gauge(self, name, documentation, labels=(), function=None):
+        """
+        Create and register a gauge, see Metric.
+        """
+        return self.register(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        """
+        Create and register a histogram, see Histogram.
+        """
+        return self.register(
+            Histogram(name, documentation, labels, buckets)
+        )
+
+    def register(self, metric):
+        """
+        Register a metric.
+
+        @param metric: New metric.
+        @type metric: Metric
+        @return: Registered metric.
+        @rtype: Metric
+        """
+        with self.lock:
+            if metric.name in self.names:
+                raise ValueError(
+                    "Metric {} is already registered.".format(metric.name)
+                )
+
+            self.names.add(metric.name)
+            self.metrics.append(metric)
+
+        return metric
+
+    def render(self):
+        """
+        Render all metrics in the text format of Prometheus.
+
+        @return: Metrics
+        @rtype: str
+        """
+        with self.lock:
+            metrics = list(self.metrics)
+
+        lines = []
+        for metric in metrics:
+            lines.append("# HELP {} {}".format(
+                metric.name, metric.documentation.replace("\n", " ")
+            ))
+            lines.append("# TYPE {} {}".format(metric.name, metric.type))
+
+            for suffix, labels, value in metric.samples():
+                lines.append("{}{}{} {}".format(
+                    metric.name, suffix, _format_labels(labels),
+                    _format_value(value)
+                ))
+
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram, **labels):
+    """
+    Decorator observing the duration of every call of a function.
+
+    @param histogram: Histogram the durations are added to.
+    @type histogram: Histogram
+    @param labels: Label values.
+    @type labels: dict
+    @return: Decorator
+    @rtype: func
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapping_func(*args, **kwargs):
+            start_time = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.time() - start_time, **labels)
+
+        return wrapping_func
+    return decorator
+
+
+def lookups_by_result(get_cache):
+    """
+    Create a function computing the lookups in a cache by result ("hit" or
+    "miss") from the statistics of the cache, for counters with the label
+    "result".
+
+    @param get_cache: Function returning the cache, an object whose method
+    statistics() returns a dictionary with "hits" and "misses", or None if
+    there is no cache (yet).
+    @type get_cache: func
+    @return: Function returning the lookups by label values, no samples if
+    there is no cache.
+    @rtype: func
+    """
+    def lookups():
+        cache = get_cache()
+        if cache is None:
+            return {}
+
+        statistics = cache.statistics()
+        return {
+            ("hit", ): statistics["hits"], ("miss", ): statistics["misses"]
+        }
+
+    return lookups
+
+
+def _format_labels(labels):
+    """
+    Format the labels of a sample, escaping their values.
+
+    @param labels: Label values by label name.
+    @type labels: dict
+    @return: Labels, e.g. '{method="GET",status="200"}', or an empty string
+    if there are none.
+    @rtype: str
+    """
+    if not labels:
+        return ""
+
+    return "{" + ",".join(
+        '{}="{}"'.format(
+            name, str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n")
+        )
+        for name, value in sorted(labels.items())
+    ) + "}"
+
+
+def _format_value(value):
+    """
+    Format the value of a sample. Integers are kept as they are, booleans
+    become 0 or 1.
+
+    @param value: Value.
+    @type value: int or float or bool
+    @return: Value, e.g. "3" or "0.25".
+    @rtype: str
+    """
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, Integral):
+        return str(value)
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+registry.gauge(
+    "hackerbabel_threads", "Live threads of the process.",
+    function=active_count
+)
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in profiling of single requests and refresh cycles. Profiles are written
+to a directory keeping only the most recent ones.
+
+Two kinds of profiles are supported: "sampling" records the stack of the
+profiled thread in a regular interval and writes it in the collapsed format
+read by flame graph tools (flamegraph.pl, speedscope), "cprofile" writes the
+statistics of cProfile (readable with pstats or snakeviz).
+
+If profiling is disabled, no profiler is created and nothing is hooked into
+requests or refresh cycles. Requests can only force a profile with a secret
+token, and streamed responses (e.g. event streams) are never profiled.
+"""
+
+# STD
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import datetime
+import hmac
+import logging
+import os
+from random import random
+import re
+import sys
+from threading import current_thread, Event, Lock, Thread
+
+# EXT
+from flask import current_app, g, request
+
+# PROJECT
+from hackerbabel.src.helpers import check_and_create_directory
+
+# CONST
+LOGGER = logging.getLogger(__name__)
+EXTENSIONS = {"sampling": ".folded", "cprofile": ".prof"}
+UNSAFE_CHARACTERS = re.compile(r"[^\w.-]+")
+
+
+class StackSampler(object):
+    """
+    Records the stack of one thread in a regular interval from another
+    thread, so the profiled code isn't slowed down by tracing.
+    """
+    def __init__(self, thread_id, interval=0.005):
+        """
+        Initializer.
+
+        @param thread_id: Identifier of the thread to be sampled.
+        @type thread_id: int
+        @param interval: Time between samples in seconds.
+        @type interval: float
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Start sampling.
+        """
+        self.thread = Thread(target=self._sample)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop sampling.
+        """
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self):
+        """
+        Return the recorded stacks in the collapsed format: One line per
+        stack, the frames from the outermost to the innermost separated by
+        semicolons, followed by the number of samples.
+
+        @return: Collapsed stacks.
+        @rtype: str
+        """
+        return "".join(
+            "{} {}\n".format(stack, samples)
+            for stack, samples in sorted(self.stacks.items())
+        )
+
+    def _sample(self):
+        """
+        Record the stack of the sampled thread every interval until stopped.
+        Runs in the sampler's own thread.
+        """
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{} ({}:{})".format(
+                    code.co_name, os.path.basename(code.co_filename),
+                    code.co_firstlineno
+                ))
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class Profiler(object):
+    """
+    Profile a sample of requests and refresh cycles. Requests carrying the
+    profiling header with the secret token are always profiled, and the name
+    of their profile is returned in the same header.
+    """
+    def __init__(self, directory, sample_rate=0.01, retention=100,
+                 mode="sampling", interval=0.005, header=None, token=None):
+        """
+        Initializer.
+
+        @param directory: Directory the profiles are written to.
+        @type directory: str or unicode
+        @param sample_rate: Fraction of requests and cycles profiled.
+        @type sample_rate: float
+        @param retention: Maximum number of profiles kept, older ones are
+        deleted.
+        @type retention: int
+        @param mode: Kind of profile, "sampling" or "cprofile".
+        @type mode: str
+        @param interval: Time between samples in seconds ("sampling" only).
+        @type interval: float
+        @param header: Request header forcing a request to be profiled or
+        None.
+        @type header: str or None
+        @param token: Value of the header required to force a profile. If
+        None, the header is only accepted while the app is in debug mode.
+        @type token: str or None
+        """
+        if mode not in EXTENSIONS:
+            raise ValueError("Unknown profiling mode: {}".format(mode))
+
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.retention = retention
+        self.mode = mode
+        self.interval = interval
+        self.header = header
+        self.token = token
+        self.lock = Lock()
+
+        check_and_create_directory(directory)
+
+    def init_app(self, app):
+        """
+        Profile requests to an app.
+
+        @param app: Flask app
+        @type app: flask.Flask
+        """
+        app.before_request(self._start_request)
+        app.after_request(self._add_profile_header)
+        app.teardown_request(self._finish_request)
+
+    def should_profile(self, forced=False):
+        """
+        Decide whether to profile the next request or cycle.
+
+        @param forced: Profile regardless of the sample rate.
+        @type forced: bool
+        @return: True if it should be profiled.
+        @rtype: bool
+        """
+        return forced or random() < self.sample_rate
+
+    @contextmanager
+    def profile(self, name):
+        """
+        Profile the current thread while inside this context.
+
+        @param name: Name of what's profiled, e.g. "cycle", part of the name of
+        the profile.
+        @type name: str
+        """
+        session = self.start(name)
+        try:
+            yield
+        finally:
+            self.finish(session)
+
+    def start(self, name):
+        """
+        Start profiling the current thread.
+
+        @param name: Name of what's profiled, part of the name of the profile.
+        @type name: str
+        @return: Profiling session to be passed to finish().
+        @rtype: tuple
+        """
+        path = os.path.join(self.directory, "{}-{}-{}{}".format(
+            datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S.%f"),
+            UNSAFE_CHARACTERS.sub("_", name), os.getpid(),
+            EXTENSIONS[self.mode]
+        ))
+
+        if self.mode == "cprofile":
+            recorder = cProfile.Profile()
+            recorder.enable()
+        else:
+            recorder = StackSampler(current_thread().ident, self.interval)
+            recorder.start()
+
+        return path, recorder
+
+    def finish(self, session):
+        """
+        Stop profiling and write the profile.
+
+        @param session: Session returned by start().
+        @type session: tuple
+        @return: Path of the profile.
+        @rtype: str
+        """
+        path, recorder = session
+
+        if self.mode == "cprofile":
+            recorder.disable()
+            recorder.dump_stats(path)
+        else:
+            recorder.stop()
+            with open(path, "w") as profile_file:
+                profile_file.write(recorder.collapsed())
+
+        self._remove_old_profiles()
+        LOGGER.info("Wrote profile {}.".format(path))
+        return path
+
+    def discard(self, session):
+        """
+        Stop profiling without writing the profile.
+
+        @param session: Session returned by start().
+        @type session: tuple
+        """
+        _, recorder = session
+
+        if self.mode == "cprofile":
+            recorder.disable()
+        else:
+            recorder.stop()
+
+    def _is_forced(self):
+        """
+        Check whether the current request may force a profile. The request
+        has to carry the profiling header; its value has to match the token,
+        or, if no token is configured, the app has to be in debug mode.
+
+        @return: True if the request may force a profile.
+        @rtype: bool
+        """
+        if self.header is None or self.header not in request.headers:
+            return False
+
+        if self.token is None:
+            return current_app.debug
+
+        return hmac.compare_digest(
+            request.headers[self.header].encode("utf-8"),
+            self.token.encode("utf-8")
+        )
+
+    def _start_request(self):
+        """
+        Start profiling a request if it's sampled or may force a profile (see
+        _is_forced()). The session is kept in flask.g until the request is
+        finished.
+        """
+        forced = self._is_forced()
+
+        if self.should_profile(forced):
+            g.profiling_forced = forced
+            g.profiling_session = self.start(
+                "request-{}".format(request.endpoint or "unknown")
+            )
+
+    def _add_profile_header(self, response):
+        """
+        Return the name of the profile in the profiling header, but only to
+        requests that forced it, i.e. that carried the token (or the header
+        while in debug mode without a token). Profiles of streamed responses
+        are discarded, the stream is only consumed after the request.
+
+        @param response: Response to the request.
+        @type response: flask.Response
+        @return: Response
+        @rtype: flask.Response
+        """
+        session = getattr(g, "profiling_session", None)
+
+        if session is None:
+            return response
+
+        if response.is_streamed:
+            # Would be profiled for as long as the stream is open
+            g.profiling_session = None
+            self.discard(session)
+        elif g.profiling_forced:
+            response.headers[self.header] = os.path.basename(session[0])
+
+        return response
+
+    def _finish_request(self, exception=None):
+        """
+        Stop profiling the request and write its profile, also if the request
+        failed.
+
+        @param exception: Exception that ended the request or None.
+        @type exception: Exception or None
+        """
+        session = getattr(g, "profiling_session", None)
+
+        if session is not None:
+            g.profiling_session = None
+            self.finish(session)
+
+    def _remove_old_profiles(self):
+        """
+        Delete the oldest profiles in the directory, so only the number of
+        profiles given by the retention is kept.
+        """
+        with self.lock:
+            profiles = sorted(
+                os.path.join(self.directory, filename)
+                for filename in os.listdir(self.directory)
+                if os.path.splitext(filename)[1] in EXTENSIONS.values()
+            )
+
+            # Names start with the time of profiling
+            for path in profiles[:max(len(profiles) - self.retention, 0)]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # Removed by another process
+
+
+def create_profiler(config):
+    """
+    Create the profiler described by the config.
+
+    @param config: Flask app config
+    @type config: dict
+    @return: Profiler or None if profiling is disabled.
+    @rtype: Profiler or None
+    """
+    if not config.get("PROFILING_ENABLED", False):
+        return None
+
+    return Profiler(
+        config.get("PROFILING_DIR", "data/profiles"),
+        config.get("PROFILING_SAMPLE_RATE", 0.01),
+        config.get("PROFILING_RETENTION", 100),
+        config.get("PROFILING_MODE", "sampling"),
+        config.get("PROFILING_INTERVAL", 0.005),
+        config.get("PROFILING_HEADER"),
+        config.get("PROFILING_TOKEN")
+    )
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers to deal with an unreliable remote API: Delays between retries and a
+circuit breaker that stops requests while the API keeps failing.
+"""
+
+# STD
+import logging
+import random
+from threading import Condition
+import time
+
+# CONST
+LOGGER = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt, base_delay=1, max_delay=60):
+    """
+    Determine how long to wait before retrying a request, using exponential
+    backoff with full jitter, so clients retrying at the same time spread out.
+
+    @param attempt: Number of failed attempts so far (starting at 0).
+    @type attempt: int
+    @param base_delay: Delay in seconds the exponential growth starts with.
+    @type base_delay: float
+    @param max_delay: Maximum delay in seconds.
+    @type max_delay: float
+    @return: Delay in seconds.
+    @rtype: float
+    """
+    return random.uniform(0, min(base_delay * 2 ** attempt, max_delay))
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker shared by all threads talking to the same API. After a
+    number of consecutive failures, the circuit opens and callers are blocked
+    until the reset timeout passed. Then a single trial request is let through:
+    If it succeeds, the circuit closes again, otherwise it stays open for
+    another reset timeout. A trial whose outcome isn't recorded within the
+    reset timeout is given up and the next caller makes a new one.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        """
+        Initializer.
+
+        @param failure_threshold: Number of consecutive failures after which
+        the circuit opens.
+        @type failure_threshold: int
+        @param reset_timeout: Time in seconds the circuit stays open.
+        @type reset_timeout: float
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.condition = Condition()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = None
+        self.trial_started = None
+        self.trips = 0
+
+    def wait(self):
+        """
+        Block until a request may be made.
+        """
+        with self.condition:
+            while True:
+                if self.state == self.CLOSED:
+                    return
+
+                if self.state == self.OPEN:
+                    remaining = self.opened + self.reset_timeout - time.time()
+
+                    if remaining <= 0:
+                        # Let this caller make the trial request
+                        self.state = self.HALF_OPEN
+                        self.trial_started = time.time()
+                        return
+
+                    self.condition.wait(remaining)
+                else:
+                    # Wait for the outcome of the trial request
+                    remaining = self.trial_started + self.reset_timeout - \
+                        time.time()
+
+                    if remaining <= 0:
+                        LOGGER.warning(
+                            "Trial request didn't report back, letting "
+                            "another one through."
+                        )
+                        self.trial_started = time.time()
+                        return
+
+                    self.condition.wait(remaining)
+
+    def record_success(self):
+        """
+        Record a successful request, closing the circuit.
+        """
+        with self.condition:
+            if self.state != self.CLOSED:
+                LOGGER.info("Circuit closed again.")
+
+            self.state = self.CLOSED
+            self.failures = 0
+            self.condition.notify_all()
+
+    def record_failure(self):
+        """
+        Record a failed request, opening the circuit if the trial request
+        failed or there were too many failures in a row.
+        """
+        with self.condition:
+            self.failures += 1
+
+            if self.state == self.HALF_OPEN or \
+                    self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    LOGGER.warning(
+                        "Circuit opened after {} failure(s), pausing requests "
+                        "for {} seconds.".format(
+                            self.failures, self.reset_timeout
+                        )
+                    )
+
+                self.state = self.OPEN
+                self.opened = time.time()
+                self.condition.notify_all()
+
+    def statistics(self):
+        """
+        Return the state of the circuit breaker.
+
+        @return: State, consecutive failures and number of times the circuit
+        opened.
+        @rtype: dict
+        """
+        with self.condition:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips
+            }
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+"""
+Scheduler submitting translation jobs on a fixed pool of worker threads and
+poller collecting their results.
+"""
+
+# STD
+import json
+import logging
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock, Thread
+import time
+
+try:
+    from Queue import Queue  # Python 2
+except ImportError:
+    from queue import Queue
+
+# PROJECT
+from hackerbabel.clients.unbabel_client import UnbabelClient
+from hackerbabel.src.metrics import registry
+
+# CONST
+LOGGER = logging.getLogger(__name__)
+FAILED_STATUSES = {"failed", "canceled"}
+TRANSLATION_JOBS = registry.gauge(
+    "hackerbabel_translation_jobs",
+    "Translation jobs queued, being submitted and waiting for their "
+    "translation.", labels=("state", )
+)
+TRANSLATIONS = registry.counter(
+    "hackerbabel_translations_total",
+    "Translation jobs finished by the Unbabel API, by final status.",
+    labels=("status", )
+)
+
+
+class TranslationScheduler(object):
+    """
+    Job queue drained by a fixed number of worker threads, so the number of
+    threads doesn't depend on the number of titles waiting to be translated.
+    Workers submit jobs (e.g. UnbabelDaemon) to the Unbabel API and hand them
+    over to the poller. A job whose key is already queued or being submitted
+    is ignored.
+    """
+    def __init__(self, workers, poller):
+        """
+        Initializer.
+
+        @param workers: Number of worker threads.
+        @type workers: int
+        @param poller: Poller collecting the results of submitted jobs.
+        @type poller: TranslationPoller
+        """
+        self.workers = workers
+        self.poller = poller
+        self.queue = Queue()
+        self.lock = Lock()
+        self.in_flight = 0
+        self.keys = set()
+        self.threads = []
+        TRANSLATION_JOBS.set_function(self._job_counts)
+
+    def start(self):
+        """
+        Start the worker threads and the poller.
+        """
+        self.poller.start()
+
+        for number in range(self.workers):
+            thread = Thread(
+                target=self._work, name="TranslationWorker-{}".format(number)
+            )
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def schedule(self, job):
+        """
+        Add a job to the queue.
+
+        @param job: Translation job.
+        @type job: UnbabelDaemon
+        @return: False if the same job is already queued or being submitted.
+        @rtype: bool
+        """
+        with self.lock:
+            if job.key in self.keys:
+                return False
+            self.keys.add(job.key)
+
+        self.queue.put(job)
+        return True
+
+    def statistics(self):
+        """
+        Return the current load of the scheduler.
+
+        @return: Number of workers, queued jobs, jobs being submitted and jobs
+        waiting for their translation.
+        @rtype: dict
+        """
+        with self.lock:
+            in_flight = self.in_flight
+
+        return {
+            "workers": self.workers,
+            "queued": self.queue.qsize(),
+            "in_flight": in_flight,
+            "pending": self.poller.pending()
+        }
+
+    def _job_counts(self):
+        """
+        Return the number of jobs in each state for the translation jobs
+        gauge.
+
+        @return: Number of jobs by state (as tuple), i.e. "queued",
+        "in_flight" and "pending".
+        @rtype: dict
+        """
+        statistics = self.statistics()
+        return {
+            (state, ): statistics[state]
+            for state in ("queued", "in_flight", "pending")
+        }
+
+    def _work(self):
+        """
+        Take jobs from the queue and execute them, forever.
+        """
+        while True:
+            job = self.queue.get()
+
+            with self.lock:
+                self.in_flight += 1
+
+            try:
+                uid = job.submit()
+
+                if uid is not None:
+                    self.poller.track(job, uid)
+            except Exception:
+                LOGGER.exception("Translation job failed.")
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+                    self.keys.discard(job.key)
+                self.queue.task_done()
+
+
+class TranslationPoller(object):
+    """
+    Single thread checking the status of all submitted translation jobs.
+    Due jobs are checked together with concurrent requests. Every job is
+    checked more rarely the longer it takes, starting with the minimum interval
+    and growing by the backoff factor up to the maximum interval. Jobs that
+    haven't finished after the maximum age are given up.
+    """
+    def __init__(self, min_interval, max_interval, backoff=1.5, workers=8,
+                 max_age=86400):
+        """
+        Initializer.
+
+        @param min_interval: Time in seconds before a job is checked the
+        first time.
+        @type min_interval: float
+        @param max_interval: Maximum time in seconds between two checks.
+        @type max_interval: float
+        @param backoff: Factor the interval grows by after every check.
+        @type backoff: float
+        @param workers: Maximum number of concurrent requests.
+        @type workers: int
+        @param max_age: Time in seconds after which a job that didn't finish
+        is marked as failed and not checked anymore.
+        @type max_age: float
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_age = max_age
+        self.ub_client = UnbabelClient()
+        self.pool = ThreadPool(workers)
+        self.lock = Lock()
+        self.wake_up = Event()
+        self.jobs = {}
+
+    def start(self):
+        """
+        Start the polling thread.
+        """
+        thread = Thread(target=self._poll, name="TranslationPoller")
+        thread.daemon = True
+        thread.start()
+
+    def track(self, job, uid):
+        """
+        Start tracking a submitted job.
+
+        @param job: Translation job.
+        @type job: UnbabelDaemon
+        @param uid: Unique Unbabel API job id.
+        @type uid: str or unicode
+        """
+        now = time.time()
+
+        with self.lock:
+            self.jobs[uid] = {
+                "job": job,
+                "checks": 0,
+                "tracked": now,
+                "next_check": now + self.min_interval
+            }
+        self.wake_up.set()
+
+    def pending(self):
+        """
+        Return the number of jobs waiting for their translation.
+
+        @return: Number of tracked jobs.
+        @rtype: int
+        """
+        with self.lock:
+            return len(self.jobs)
+
+    def _poll(self):
+        """
+        Check due jobs, forever.
+        """
+        while True:
+            now = time.time()
+            with self.lock:
+                due = [
+                    uid for uid, entry in self.jobs.items()
+                    if entry["next_check"] <= now
+                ]
+                next_check = min(
+                    [entry["next_check"] for entry in self.jobs.values()] or
+                    [now + self.max_interval]
+                )
+
+            if due:
+                for uid, status in zip(due, self.pool.map(self._check, due)):
+                    self._dispatch(uid, status)
+            else:
+                self.wake_up.wait(max(next_check - now, 0))
+                self.wake_up.clear()
+
+    def _check(self, uid):
+        """
+        Request the status of a job.
+
+        @param uid: Unique Unbabel API job id.
+        @type uid: str or unicode
+        @return: Decoded response or None if the request failed.
+        @rtype: dict or None
+        """
+        try:
+            response = self.ub_client.check_translation_status(uid)
+            return json.loads(response.content)
+        except Exception as exception:
+            LOGGER.warning(
+                "Couldn't check translation job {}: {}".format(
+                    uid, repr(exception)
+                )
+            )
+            return None
+
+    def _dispatch(self, uid, response_data):
+        """
+        Hand a finished job's result to the job or schedule its next check.
+
+        @param uid: Unique Unbabel API job id.
+        @type uid: str or unicode
+        @param response_data: Decoded status response or None.
+        @type response_data: dict or None
+        """
+        status = (response_data or {}).get("status")
+
+        with self.lock:
+            entry = self.jobs[uid]
+
+            if status == "completed" or status in FAILED_STATUSES:
+                del self.jobs[uid]
+                TRANSLATIONS.inc(status=status)
+            elif time.time() - entry["tracked"] >= self.max_age:
+                LOGGER.warning(
+                    "Giving up translation job {} after {} check(s).".format(
+                        uid, entry["checks"] + 1
+                    )
+                )
+                status = "expired"
+                del self.jobs[uid]
+                TRANSLATIONS.inc(status=status)
+            else:
+                entry["checks"] += 1
+                entry["next_check"] = time.time() + min(
+                    self.min_interval * self.backoff ** entry["checks"],
+                    self.max_interval
+                )
+
+        try:
+            if status == "completed":
+                entry["job"].complete(response_data["translatedText"])
+            elif status in FAILED_STATUSES or status == "expired":
+                entry["job"].fail(status)
+        except Exception:
+            LOGGER.exception("Couldn't store result of translation job.")
@@ -76,18 +76,23 @@ class TitleSchema(Schema):
 
 class CommentSchema(Schema):
     """
-    Schema to validate story comments.
+    Schema to validate comment documents.
     """
     schema = {
         "type": "object",
         "properties": {
-            "comments": {
-                "type": "array",
-                "items": {
-                    "type": "string"
-                }
-            }
-        }
+            "id": {"type": "number"},
+            "parent": {"type": "number"},
+            "story_id": {"type": "number"},
+            "thread": {"type": "number"},
+            "depth": {"type": "number"},
+            "rank": {"type": "number"},
+            "reply_count": {"type": "number"},
+            "text": {"type": "string"},
+            "author": {"type": "string"},
+            "date": {"type": "string"}
+        },
+        "required": ["id", "parent", "story_id", "depth", "rank", "text"]
     }
 
     def __init__(self):
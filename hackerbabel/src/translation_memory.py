@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Translation memory, so a text is only ever translated once into every
+language.
+"""
+
+# STD
+import datetime
+import hashlib
+import re
+import unicodedata
+
+# PROJECT
+from hackerbabel.clients.mongodb_client import MongoDBClient
+from hackerbabel.src.item_cache import LRUCache
+from hackerbabel.src.metrics import lookups_by_result, registry
+
+# CONST
+WHITESPACE = re.compile(r"\s+", re.UNICODE)
+MEMORY_LOOKUPS = registry.counter(
+    "hackerbabel_translation_memory_lookups_total",
+    "Lookups in the in-process cache of the translation memory, by result.",
+    labels=("result", )
+)
+
+
+def translation_key(text, target_lang):
+    """
+    Create the key of a translation. Texts differing only in unicode
+    representation or whitespace share the same key.
+
+    @param text: Text in the source language.
+    @type text: str or unicode
+    @param target_lang: Language the text is translated into.
+    @type target_lang: str or unicode
+    @return: Target language and SHA-1 hash of the normalized text.
+    @rtype: str
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+
+    normalized = WHITESPACE.sub(
+        u" ", unicodedata.normalize("NFKC", text)
+    ).strip()
+
+    return "{}:{}".format(
+        target_lang.upper(),
+        hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    )
+
+
+class TranslationMemory(object):
+    """
+    Translations stored in MongoDB by translation_key(), with an in-process
+    LRU cache in front.
+    """
+    def __init__(self, collection_name, cache_size=10000):
+        """
+        Initializer.
+
+        @param collection_name: Name of the collection translations are stored
+        in.
+        @type collection_name: str or unicode
+        @param cache_size: Maximum number of translations cached in-process.
+        @type cache_size: int
+        """
+        self.collection_name = collection_name
+        self.mdb_client = MongoDBClient()
+        self.cache = LRUCache(cache_size)
+        # Hits and misses are read from the cache's statistics when exposed;
+        # there is one memory per process, the latest one is reported
+        MEMORY_LOOKUPS.set_function(lookups_by_result(lambda: self))
+
+    def lookup(self, texts, target_lang):
+        """
+        Look up the translations of several texts, querying the database at
+        most once.
+
+        @param texts: Texts in the source language.
+        @type texts: list
+        @param target_lang: Language the texts are translated into.
+        @type target_lang: str or unicode
+        @return: Known translations by text.
+        @rtype: dict
+        """
+        keys = {text: translation_key(text, target_lang) for text in texts}
+        translations = {}
+        missing = {}
+
+        for text, key in keys.items():
+            translation = self.cache.get(key)
+
+            if translation is None:
+                missing.setdefault(key, []).append(text)
+            else:
+                translations[text] = translation
+
+        if missing:
+            documents = self.mdb_client.find_latest_documents(
+                "key", missing.keys(), self.collection_name, ("translation", )
+            )
+
+            for key, document in documents.items():
+                self.cache.set(key, document["translation"])
+
+                for text in missing[key]:
+                    translations[text] = document["translation"]
+
+        return translations
+
+    def get(self, text, target_lang):
+        """
+        Look up the translation of a text.
+
+        @param text: Text in the source language.
+        @type text: str or unicode
+        @param target_lang: Language the text is translated into.
+        @type target_lang: str or unicode
+        @return: Translation or None if the text wasn't translated yet.
+        @rtype: str or unicode or None
+        """
+        return self.lookup([text], target_lang).get(text)
+
+    def put(self, text, target_lang, translation):
+        """
+        Remember the translation of a text.
+
+        @param text: Text in the source language.
+        @type text: str or unicode
+        @param target_lang: Language the text is translated into.
+        @type target_lang: str or unicode
+        @param translation: Translated text.
+        @type translation: str or unicode
+        """
+        key = translation_key(text, target_lang)
+        self.mdb_client.upsert_documents(
+            [{
+                "key": key,
+                "text": text,
+                "target_language": target_lang,
+                "translation": translation,
+                "date": datetime.datetime.utcnow()
+            }],
+            self.collection_name, "key"
+        )
+        self.cache.set(key, translation)
+
+    def statistics(self):
+        """
+        Return the counters of the in-process cache.
+
+        @return: Size, hits, misses, evictions and hit ratio.
+        @rtype: dict
+        """
+        return self.cache.statistics()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+Content versions of pages, so clients can make conditional requests and only
+download a page again when the stories or translations on it changed.
+"""
+
+# STD
+from functools import wraps
+import hashlib
+import json
+
+# EXT
+from flask import current_app, make_response, request
+
+# PROJECT
+from hackerbabel.cache import (
+    cache, COMMENT_SECTION_KEY, DASHBOARD_KEY, INDEX_KEY, version_key
+)
+from hackerbabel.src.helpers import get_stories, get_story
+
+# CONST
+# Fields of a story that are shown on pages, if no fragments are stored yet
+VERSIONED_FIELDS = ("id", "rank", "url", "score", "author", "titles")
+# Templates the fragments of the stories are embedded in, by page
+PAGE_TEMPLATES = {
+    "index": ("base.html", "index.html"),
+    "dashboard": ("base.html", "dashboard.html"),
+    "comments": ("base.html", "comment_section.html")
+}
+
+
+def content_version(stories, page):
+    """
+    Derive the version of a page from the stored fragments of the stories it
+    shows.
+
+    @param stories: Stories shown on the page.
+    @type stories: list
+    @param page: Fragment the page consists of, e.g. "index" or "comments".
+    @type page: str
+    @return: ETag and time of the last modification in UTC (or None if
+    unknown).
+    @rtype: tuple
+    """
+    etag = hashlib.sha1()
+    last_modified = None
+
+    for story in stories:
+        fragments = story.get("fragments") or {}
+        fragment = fragments.get(page)
+
+        if fragment is None:
+            # Not rendered yet, fall back to the data shown on the page
+            fragment = json.dumps(
+                [story.get(field) for field in VERSIONED_FIELDS],
+                sort_keys=True, default=str
+            )
+
+        etag.update(u"{}:{}\n".format(
+            story.get("id"), fragments.get("version")
+        ).encode("utf-8"))
+        etag.update(fragment.encode("utf-8"))
+
+        modified = story.get("modified")
+        if modified is not None and (
+                last_modified is None or modified > last_modified):
+            last_modified = modified
+
+    return etag.hexdigest(), last_modified
+
+
+def cached_version(page_key, page, load_stories):
+    """
+    Look up the version of a page or derive it from the page's stories. The
+    version is cached until the page is invalidated, see
+    cache.invalidate_story_pages().
+
+    @param page_key: Cache key of the page.
+    @type page_key: str
+    @param page: Fragment the page consists of, e.g. "index" or "comments".
+    @type page: str
+    @param load_stories: Function returning the stories shown on the page.
+    @type load_stories: func
+    @return: ETag and time of the last modification in UTC (or None if
+    unknown).
+    @rtype: tuple
+    """
+    key = version_key(page_key)
+    version = cache.get(key)
+
+    if version is None:
+        version = content_version(load_stories(), page)
+        cache.set(key, version)
+
+    # Mixed in afterwards, the cache might be shared with processes running
+    # another release
+    etag, last_modified = version
+    return "{}-{}".format(layout_version(page), etag), last_modified
+
+
+def layout_version(page):
+    """
+    Derive the version of everything on a page besides its stories from the
+    page's templates and the fingerprints of the assets it references. It's
+    computed once per app, as neither changes while it's running.
+
+    @param page: Fragment the page consists of, e.g. "index" or "comments".
+    @type page: str
+    @return: Version
+    @rtype: str
+    """
+    versions = current_app.extensions.setdefault("layout_versions", {})
+
+    if page not in versions:
+        version = hashlib.sha1()
+        jinja_env = current_app.jinja_env
+
+        for template in PAGE_TEMPLATES[page]:
+            source, _, _ = jinja_env.loader.get_source(jinja_env, template)
+            version.update(source.encode("utf-8"))
+
+        assets = current_app.extensions.get("assets")
+        if assets is not None:
+            version.update(
+                json.dumps(assets.manifest, sort_keys=True).encode("utf-8")
+            )
+
+        versions[page] = version.hexdigest()[:12]
+
+    return versions[page]
+
+
+def story_list_version(story_collection, page):
+    """
+    Version of a page listing the newest stories.
+
+    @param story_collection: Name of the collections the stories are stored in.
+    @type story_collection: str or unicode
+    @param page: Fragment the page consists of, "index" or "dashboard".
+    @type page: str
+    @return: ETag and time of the last modification in UTC (or None if
+    unknown).
+    @rtype: tuple
+    """
+    return cached_version(
+        DASHBOARD_KEY if page == "dashboard" else INDEX_KEY, page,
+        lambda: get_stories(story_collection)
+    )
+
+
+def comment_section_version(story_id, story_collection):
+    """
+    Version of the comment section of a story.
+
+    @param story_id: Hacker News story id.
+    @type story_id: int
+    @param story_collection: Name of the collections the stories are stored in.
+    @type story_collection: str or unicode
+    @return: ETag and time of the last modification in UTC (or None if
+    unknown).
+    @rtype: tuple
+    """
+    def load_stories():
+        story = get_story(story_id, story_collection)
+        return [story] if story else []
+
+    return cached_version(
+        COMMENT_SECTION_KEY.format(story_id=story_id), "comments",
+        load_stories
+    )
+
+
+def conditional(version_func, prefix=""):
+    """
+    Decorator answering conditional requests to a view with "304 Not Modified"
+    before the view is called, and adding an ETag and Last-Modified header to
+    its responses otherwise.
+
+    @param version_func: Function receiving the view's arguments and returning
+    an ETag and time of the last modification or None if the content has no
+    version.
+    @type version_func: func
+    @param prefix: Prefix of the ETag, to tell different representations of
+    the same content apart.
+    @type prefix: str
+    @return: Decorator
+    @rtype: func
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapping_func(*args, **kwargs):
+            version = version_func(*args, **kwargs)
+
+            if version is None:
+                return func(*args, **kwargs)
+
+            etag = prefix + version[0]
+            last_modified = version[1]
+            if last_modified is not None:
+                last_modified = last_modified.replace(
+                    microsecond=0, tzinfo=None
+                )
+
+            if _is_not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(func(*args, **kwargs))
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Let clients store the page, but ask whether it's still current
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapping_func
+    return decorator
+
+
+def _is_not_modified(etag, last_modified):
+    """
+    Check whether the client's copy of the current request's page is still
+    current.
+
+    @param etag: Current ETag of the page.
+    @type etag: str
+    @param last_modified: Time of the page's last modification in UTC.
+    @type last_modified: datetime.datetime or None
+    @return: True if the client's copy is current.
+    @rtype: bool
+    """
+    if request.if_none_match:
+        # If-Modified-Since is ignored if If-None-Match is given. The weak
+        # comparison also matches the ETag of compressed responses.
+        return request.if_none_match.contains_weak(etag)
+
+    if_modified_since = request.if_modified_since
+    if if_modified_since is not None and last_modified is not None:
+        return last_modified <= if_modified_since.replace(tzinfo=None)
+
+    return False
@@ -1,11 +1,89 @@
 $(document).ready(function() {
 
+	var comments = $("#comments");
+	var story_id = comments.data("story-id");
+	var per_page = comments.data("per-page");
+	var next_page = 2;
+
 	// Parse html in comments
-	$(".comment-content").each(function() {
-		var raw_comment = $(this).text(); // Get
-		$(this).text("");
-		var html_comment = $.parseHTML(raw_comment); // Parse
+	function parse_comments(element) {
+		$(element).find(".comment-content").each(function() {
+			var raw_comment = $(this).text(); // Get
+			$(this).text("");
+			var html_comment = $.parseHTML(raw_comment); // Parse
+
+			$(html_comment).appendTo($(this));
+		});
+	}
+
+	// Build the same markup as the render_comment macro
+	function render_comment(comment, level) {
+		var element = $("<div>", {"class": "comment"})
+			.attr("data-comment-id", comment.id);
+		var container = $("<div>", {"class": "container-fluid"}).appendTo(element);
+		var content = $("<div>", {
+			"class": "comment-content well col-md-3 col-md-offset-" + (level + 1)
+		});
+
+		content.append($.parseHTML(comment.text));
+		$("<div>", {"class": "row"}).append(content).appendTo(container);
+
+		if (comment.reply_count && !comment.replies) {
+			$("<div>", {"class": "row"}).append(
+				$("<a>", {
+					"href": "#",
+					"class": "show-replies col-md-3 col-md-offset-" + (level + 1),
+					"text": "Show " + comment.reply_count + " replies"
+				}).attr("data-level", level + 1)
+			).appendTo(container);
+		}
+
+		var replies = $("<div>", {"class": "replies"}).appendTo(element);
+		$.each(comment.replies || [], function(index, reply) {
+			replies.append(render_comment(reply, level + 1));
+		});
+
+		return element;
+	}
+
+	parse_comments(comments);
+
+	// Load replies to a comment when they are requested
+	comments.on("click", ".show-replies", function(event) {
+		event.preventDefault();
+		var link = $(this);
+		var comment = link.closest(".comment");
+		var level = link.data("level");
+
+		$.getJSON(
+			"/" + story_id + "/comments/" + comment.data("comment-id") + ".json",
+			function(data) {
+				var replies = comment.children(".replies");
+				$.each(data.replies, function(index, reply) {
+					replies.append(render_comment(reply, level));
+				});
+				link.remove();
+			}
+		);
+	});
+
+	// Load next page of top level comments
+	$("#more-comments").click(function() {
+		var button = $(this);
+
+		$.getJSON(
+			"/" + story_id + "/comments.json",
+			{"page": next_page, "per_page": per_page},
+			function(data) {
+				$.each(data.comments, function(index, comment) {
+					comments.append(render_comment(comment, 0));
+				});
+				next_page += 1;
 
-		$(html_comment).appendTo($(this));
+				if (data.page * data.per_page >= data.total) {
+					button.remove();
+				}
+			}
+		);
 	});
-});
\ No newline at end of file
+});
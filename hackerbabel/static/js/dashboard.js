@@ -0,0 +1,49 @@
+$(document).ready(function() {
+
+	var table = $("#itemlist");
+
+	if (!window.EventSource) {
+		return;
+	}
+
+	function find_row(data) {
+		return table.find(
+			"tr[data-story-id='" + data.story_id + "'][data-lang='" + data.lang + "']"
+		);
+	}
+
+	function show_title(row) {
+		var lang = row.data("lang");
+		var title = row.data("title");
+
+		if (row.data("status") === "done" && title) {
+			row.find("a.storylink").text(lang + ": " + title);
+		}
+	}
+
+	var events = new EventSource(table.data("events"));
+
+	// Patch the row of a story and language in place
+	events.addEventListener("translation", function(event) {
+		var data = JSON.parse(event.data);
+		var row = find_row(data);
+
+		// Already cut off the same way as in the dashboard fragment
+		if (data.display_title || data.title) {
+			row.data("title", data.display_title || data.title);
+		}
+		if (data.status) {
+			row.data("status", data.status);
+			row.children("td").last()
+				.attr("class", data.status)
+				.text(" " + data.status + " ");
+		}
+		show_title(row);
+	});
+
+	// Different stories are listed now, get the new list
+	events.addEventListener("stories", function() {
+		events.close();
+		window.location.reload();
+	});
+});
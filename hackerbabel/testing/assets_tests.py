@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the pipeline of static assets.
+"""
+
+# STD
+import gzip
+from io import BytesIO
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+# EXT
+from flask import Flask, make_response
+from nose.tools import ok_
+
+# PROJECT
+from hackerbabel.src.assets import AssetPipeline
+
+# CONST
+STYLESHEET = b"body { background: url('../img/logo.png'); }"
+SCRIPT = b"function add(first, second) {\n    return first + second;\n}\n" * 20
+MINIFIED_SCRIPT = b"function add(a,b){return a+b}"
+
+
+class AssetPipelineTestCase(TestCase):
+    """
+    Test fingerprinting, minified variants, compression and caching of assets.
+    """
+    def __init__(self, *args, **kwargs):
+        super(AssetPipelineTestCase, self).__init__()
+
+    def runTest(self):
+        self.test_minified_variant()
+        self.test_css_references()
+        self.test_encoding_negotiation()
+        self.test_cache_headers()
+        self.test_compressed_etag()
+
+    def test_minified_variant(self):
+        """
+        Test whether the minified variant of an asset is served in its place.
+        """
+        fingerprinted = self.pipeline.url("js/app.js")
+        ok_(fingerprinted.startswith("js/app.") and
+            fingerprinted.endswith(".js"))
+        ok_(self.pipeline.assets[fingerprinted].encodings["identity"] ==
+            MINIFIED_SCRIPT, "Minified variant wasn't used.")
+
+    def test_css_references(self):
+        """
+        Test whether references inside stylesheets point to the fingerprinted
+        assets.
+        """
+        stylesheet = self.pipeline.assets[self.pipeline.url("css/base.css")]
+        data = stylesheet.encodings["identity"].decode("utf-8")
+
+        ok_("url('../{}')".format(self.pipeline.url("img/logo.png")) in data,
+            "Reference wasn't fingerprinted: {}".format(data))
+
+    def test_encoding_negotiation(self):
+        """
+        Test whether compressed assets are only sent to clients accepting
+        them.
+        """
+        path = "/assets/" + self.pipeline.url("js/plain.js")
+
+        response = self.client.get(path, headers={"Accept-Encoding": "gzip"})
+        ok_(response.headers.get("Content-Encoding") == "gzip")
+        ok_(gzip.GzipFile(fileobj=BytesIO(response.data)).read() == SCRIPT)
+
+        response = self.client.get(path, headers={"Accept-Encoding": ""})
+        ok_("Content-Encoding" not in response.headers)
+        ok_(response.data == SCRIPT)
+
+    def test_cache_headers(self):
+        """
+        Test whether fingerprinted assets may be cached forever.
+        """
+        response = self.client.get(
+            "/assets/" + self.pipeline.url("css/base.css")
+        )
+        cache_control = response.headers["Cache-Control"]
+
+        ok_("public" in cache_control and "immutable" in cache_control)
+        ok_("max-age=31536000" in cache_control)
+        ok_(response.headers["Vary"] == "Accept-Encoding")
+        ok_(self.client.get("/assets/css/base.css").status_code == 404)
+
+    def test_compressed_etag(self):
+        """
+        Test whether compressed pages carry a weak ETag that still answers
+        conditional requests.
+        """
+        response = self.client.get("/page", headers={"Accept-Encoding": ""})
+        ok_(response.headers["ETag"] == '"page"')
+        ok_(response.headers["Vary"] == "Accept-Encoding",
+            "Uncompressed page doesn't vary by encoding.")
+
+        response = self.client.get(
+            "/page", headers={"Accept-Encoding": "gzip"}
+        )
+        ok_(response.headers.get("Content-Encoding") == "gzip")
+        ok_(response.headers["ETag"] == 'W/"page"')
+
+    def setUp(self):
+        self.static_folder = tempfile.mkdtemp()
+        for name, data in (("css/base.css", STYLESHEET),
+                           ("img/logo.png", b"\x89PNG"),
+                           ("js/app.js", SCRIPT),
+                           ("js/app.min.js", MINIFIED_SCRIPT),
+                           ("js/plain.js", SCRIPT)):
+            path = os.path.join(self.static_folder, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as asset_file:
+                asset_file.write(data)
+
+        app = Flask(__name__, static_folder=self.static_folder)
+
+        @app.route("/page")
+        def page():
+            response = make_response(u"<p>Page</p>" * 100)
+            response.set_etag("page")
+            return response
+
+        self.pipeline = AssetPipeline(app)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.static_folder)
+
@@ -14,6 +14,9 @@ from bs4 import BeautifulSoup
 from nose.tools import ok_
 
 # PROJECT
+from hackerbabel.benchmarks.fake_services import (
+    FakeHackerNewsServer, FIRST_ITEM_ID, synthetic_items
+)
 from hackerbabel.clients.hackernews_client import HackerNewsClient
 from hackerbabel.src.helpers import get_config_from_py_file
 from hackerbabel.testing.configuration_tests import CONFIG_PATH
@@ -95,3 +98,78 @@ class HackerNewsClientTestCase(TestCase):
         self.hn_client = HackerNewsClient()
         self.hn_client.initialize(**config)
         self.schema = ArticleSchema()
+
+
+class FakeHackerNewsAPITestCase(TestCase):
+    """
+    Test the HackerNews client against the fake Hacker News API of the
+    benchmarks, so the whole ingest can be checked without the network.
+    """
+    def __init__(self, *args, **kwargs):
+        super(FakeHackerNewsAPITestCase, self).__init__()
+
+    def runTest(self):
+        self.test_get_top_stories()
+        self.test_new_replies()
+
+    def test_get_top_stories(self):
+        """
+        Test whether all top stories and their comments are ingested from the
+        configured API.
+        """
+        stories = self.hn_client.get_top_stories()
+
+        ok_([story["id"] for story in stories] == self.story_ids[:3])
+        for story in stories:
+            self.schema.validate(story)
+            ok_(len(story["comments"]) == 6, "Comments are missing.")
+
+        statistics = self.hn_server.statistics()
+        ok_(statistics.get("comment") == 18, "Comments weren't fetched from "
+            "the fake API: {}".format(statistics))
+
+    def test_new_replies(self):
+        """
+        Test whether cached comments are fetched again once their story got
+        new comments, so new replies aren't missed.
+        """
+        self.hn_client.initialize(
+            HN_API_URI=self.hn_server.api_uri, NUMBER_OF_STORIES=3,
+            HN_ITEM_STORE_PATH=None
+        )
+        self.hn_client.get_top_stories()
+
+        story = self.hn_server.items[self.story_ids[0]]
+        parent = self.hn_server.items[story["kids"][0]]
+        reply = dict(
+            parent, id=FIRST_ITEM_ID - 1, parent=parent["id"], kids=[]
+        )
+        self.hn_server.items[reply["id"]] = reply
+        parent["kids"].append(reply["id"])
+        story["descendants"] += 1
+        self.hn_server.reset_statistics()
+
+        stories = self.hn_client.get_top_stories()
+        comment_ids = [comment["id"] for comment in stories[0]["comments"]]
+        ok_(reply["id"] in comment_ids, "New reply is missing.")
+        ok_(len(stories[1]["comments"]) == 6)
+
+        # Only the comments of the story with new comments were fetched again
+        statistics = self.hn_server.statistics()
+        ok_(statistics.get("comment") == 7, "Unchanged comments weren't "
+            "served from the cache: {}".format(statistics))
+
+    def setUp(self):
+        self.story_ids, items = synthetic_items(5, 2, 2)
+        self.hn_server = FakeHackerNewsServer(self.story_ids, items)
+        self.hn_server.start()
+
+        self.hn_client = HackerNewsClient()
+        self.hn_client.initialize(
+            HN_API_URI=self.hn_server.api_uri, NUMBER_OF_STORIES=3,
+            HN_ITEM_CACHE_SIZE=0, HN_ITEM_STORE_PATH=None
+        )
+        self.schema = ArticleSchema()
+
+    def tearDown(self):
+        self.hn_server.stop()
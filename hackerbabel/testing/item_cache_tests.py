@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the in-process item cache.
+"""
+
+# STD
+import time
+from unittest import TestCase
+
+# EXT
+from nose.tools import ok_
+
+# PROJECT
+from hackerbabel.src.item_cache import ItemCache
+
+
+class ItemCacheTestCase(TestCase):
+    """
+    Test eviction, expiration and statistics of the item cache.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ItemCacheTestCase, self).__init__()
+
+    def runTest(self):
+        self.test_eviction()
+        self.test_age_dependent_ttl()
+        self.test_expiration()
+
+    def test_eviction(self):
+        """
+        Test whether the least recently used item is evicted when the cache is
+        full.
+        """
+        now = time.time()
+        for item_id in range(3):
+            self.item_cache.set(item_id, {"id": item_id, "time": now})
+
+        self.item_cache.get(0)  # 1 is now the least recently used item
+        self.item_cache.set(3, {"id": 3, "time": now})
+
+        ok_(self.item_cache.get(1) is None, "Item 1 wasn't evicted.")
+        ok_(self.item_cache.get(0) is not None, "Item 0 was evicted.")
+
+        statistics = self.item_cache.statistics()
+        ok_(statistics["size"] == 3)
+        ok_(statistics["evictions"] == 1)
+        ok_(statistics["hits"] == 2 and statistics["misses"] == 1)
+
+    def test_age_dependent_ttl(self):
+        """
+        Test whether older items are cached longer.
+        """
+        now = time.time()
+        new_item = {"id": 1, "time": now - 60}
+        old_item = {"id": 2, "time": now - 3600 * 5}
+        ancient_item = {"id": 3, "time": now - 3600 * 24 * 365}
+
+        ok_(self.item_cache.ttl(new_item, now) == self.item_cache.min_ttl)
+        ok_(self.item_cache.ttl(old_item, now) == 1800)
+        ok_(self.item_cache.ttl(ancient_item, now) == self.item_cache.max_ttl)
+
+    def test_expiration(self):
+        """
+        Test whether expired items aren't returned anymore.
+        """
+        now = time.time()
+        fetched = now - self.item_cache.min_ttl - 1
+        self.item_cache.set(4, {"id": 4, "time": fetched}, fetched=fetched)
+
+        ok_(self.item_cache.get(4) is None, "Expired item was returned.")
+        ok_(self.item_cache.statistics()["expirations"] == 1)
+
+    def setUp(self):
+        self.item_cache = ItemCache(
+            3, min_ttl=60, max_ttl=86400, age_factor=0.1
+        )
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the persistent item store.
+"""
+
+# STD
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+# EXT
+from nose.tools import ok_
+
+# PROJECT
+from hackerbabel.src.item_store import ItemStore
+
+
+class ItemStoreTestCase(TestCase):
+    """
+    Test storing, reloading and pruning items.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ItemStoreTestCase, self).__init__()
+
+    def runTest(self):
+        self.test_get_and_put()
+        self.test_persistence()
+        self.test_pruning()
+
+    def test_get_and_put(self):
+        """
+        Test whether items can be looked up before and after they're flushed.
+        """
+        item = {"id": 1, "type": "comment", "text": "Hello"}
+        self.item_store.put(1, item, fetched=100)
+
+        ok_(self.item_store.get(1) == (item, 100), "Buffered item missing.")
+        ok_(self.item_store.flush() == 1)
+        ok_(self.item_store.get(1) == (item, 100), "Written item missing.")
+        ok_(self.item_store.get(2) is None)
+
+    def test_persistence(self):
+        """
+        Test whether flushed items survive reopening the store.
+        """
+        self.item_store.put(3, {"id": 3}, fetched=100)
+        self.item_store.flush()
+
+        reopened = ItemStore(self.path)
+        ok_(reopened.get(3) == ({"id": 3}, 100), "Item wasn't persisted.")
+
+    def test_pruning(self):
+        """
+        Test whether only items older than the maximum age are removed.
+        """
+        now = time.time()
+        self.item_store.put(4, {"id": 4}, fetched=now - 7200)
+        self.item_store.put(5, {"id": 5}, fetched=now - 60)
+        self.item_store.flush()
+
+        self.item_store.prune(now)
+        ok_(self.item_store.get(4) is None, "Expired item wasn't removed.")
+        ok_(self.item_store.get(5) is not None, "Fresh item was removed.")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "items.db")
+        self.item_store = ItemStore(self.path, max_age=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
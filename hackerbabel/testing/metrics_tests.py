@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the metrics registry.
+"""
+
+# STD
+from unittest import TestCase
+
+# EXT
+from nose.tools import ok_
+
+# PROJECT
+from hackerbabel.src.item_cache import LRUCache
+from hackerbabel.src.metrics import lookups_by_result, MetricsRegistry
+
+
+class MetricsTestCase(TestCase):
+    """
+    Test the metrics and their rendering in the text format of Prometheus.
+    """
+    def __init__(self, *args, **kwargs):
+        super(MetricsTestCase, self).__init__()
+
+    def runTest(self):
+        self.test_counter()
+        self.test_mixed_label_types()
+        self.test_histogram()
+        self.test_function()
+        self.test_lookups_by_result()
+
+    def test_counter(self):
+        """
+        Test whether counters are added up per label value.
+        """
+        counter = self.registry.counter(
+            "test_requests_total", "Requests.", labels=("status", )
+        )
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+        counter.inc(status=404)
+
+        rendered = self.registry.render()
+        ok_("# TYPE test_requests_total counter" in rendered)
+        ok_('test_requests_total{status="200"} 3' in rendered)
+        ok_('test_requests_total{status="404"} 1' in rendered)
+
+    def test_mixed_label_types(self):
+        """
+        Test whether label values of different types can be rendered
+        together.
+        """
+        counter = self.registry.counter(
+            "test_responses_total", "Responses.", labels=("status", )
+        )
+        counter.inc(status=201)
+        counter.inc(status="error")
+        counter.inc(status="201")
+
+        rendered = self.registry.render()
+        ok_('test_responses_total{status="201"} 2' in rendered)
+        ok_('test_responses_total{status="error"} 1' in rendered)
+
+    def test_histogram(self):
+        """
+        Test whether histogram buckets are accumulated.
+        """
+        histogram = self.registry.histogram(
+            "test_seconds", "Durations.", buckets=(0.1, 1)
+        )
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        rendered = self.registry.render()
+        ok_('test_seconds_bucket{le="0.1"} 2' in rendered)
+        ok_('test_seconds_bucket{le="1.0"} 3' in rendered)
+        ok_('test_seconds_bucket{le="+Inf"} 4' in rendered)
+        ok_("test_seconds_sum 5.65" in rendered)
+        ok_("test_seconds_count 4" in rendered)
+
+    def test_function(self):
+        """
+        Test whether metrics computed by a function are rendered with their
+        current value.
+        """
+        values = {("hit", ): 1, ("miss", ): 0}
+        self.registry.counter(
+            "test_lookups_total", "Lookups.", labels=("result", ),
+            function=lambda: values
+        )
+        values[("miss", )] = 2
+
+        ok_('test_lookups_total{result="miss"} 2' in self.registry.render())
+
+    def test_lookups_by_result(self):
+        """
+        Test whether the lookups of a cache are computed from its statistics
+        once the cache exists.
+        """
+        caches = []
+        self.registry.counter(
+            "test_cache_lookups_total", "Lookups.", labels=("result", ),
+            function=lookups_by_result(lambda: caches[0] if caches else None)
+        )
+        ok_("test_cache_lookups_total{" not in self.registry.render())
+
+        caches.append(LRUCache(10))
+        caches[0].set("key", "value")
+        caches[0].get("key")
+        caches[0].get("other key")
+
+        rendered = self.registry.render()
+        ok_('test_cache_lookups_total{result="hit"} 1' in rendered)
+        ok_('test_cache_lookups_total{result="miss"} 1' in rendered)
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
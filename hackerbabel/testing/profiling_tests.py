@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the profiling of requests and refresh cycles.
+"""
+
+# STD
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+# EXT
+from flask import Flask, Response
+from nose.tools import ok_
+
+# PROJECT
+from hackerbabel.src.profiling import create_profiler, Profiler
+
+
+class ProfilingTestCase(TestCase):
+    """
+    Test writing profiles and keeping only the most recent ones.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ProfilingTestCase, self).__init__()
+
+    def runTest(self):
+        self.test_sampling()
+        self.test_cprofile()
+        self.test_retention()
+        self.test_disabled()
+        self.test_forced_requests()
+
+    def test_sampling(self):
+        """
+        Test whether the stacks of the profiled code are collapsed.
+        """
+        profiler = Profiler(self.directory, interval=0.001)
+        with profiler.profile("cycle"):
+            _busy(0.05)
+
+        with open(self._profiles(".folded")[0]) as profile_file:
+            stacks = profile_file.read()
+
+        ok_(";_busy (" in stacks)
+        ok_(all(line.rsplit(" ", 1)[1].isdigit()
+                for line in stacks.splitlines()))
+
+    def test_cprofile(self):
+        """
+        Test whether cProfile statistics are written.
+        """
+        profiler = Profiler(self.directory, mode="cprofile")
+        with profiler.profile("cycle"):
+            _busy(0.01)
+
+        ok_(len(self._profiles(".prof")) == 1)
+
+    def test_retention(self):
+        """
+        Test whether older profiles are deleted.
+        """
+        profiler = Profiler(self.directory, retention=2, mode="cprofile")
+        for _ in range(4):
+            with profiler.profile("cycle"):
+                pass
+
+        ok_(len(self._profiles(".prof")) == 2)
+
+    def test_disabled(self):
+        """
+        Test whether no profiler is created if profiling is disabled.
+        """
+        ok_(create_profiler({"PROFILING_ENABLED": False}) is None)
+        ok_(create_profiler({
+            "PROFILING_ENABLED": True, "PROFILING_DIR": self.directory
+        }) is not None)
+
+    def test_forced_requests(self):
+        """
+        Test whether only requests with the token force a profile and
+        streamed responses aren't profiled.
+        """
+        app = Flask(__name__)
+        app.add_url_rule("/page", "page", lambda: "Page")
+        app.add_url_rule(
+            "/stream", "stream", lambda: Response(iter(["event"]))
+        )
+        directory = os.path.join(self.directory, "requests")
+        Profiler(
+            directory, sample_rate=0, mode="cprofile",
+            header="X-Profile", token="secret"
+        ).init_app(app)
+        client = app.test_client()
+
+        response = client.get("/page", headers={"X-Profile": "guess"})
+        ok_("X-Profile" not in response.headers)
+        ok_(not os.listdir(directory), "Request without token profiled.")
+
+        response = client.get("/page", headers={"X-Profile": "secret"})
+        ok_(os.listdir(directory) == [response.headers["X-Profile"]])
+
+        response = client.get("/stream", headers={"X-Profile": "secret"})
+        ok_("X-Profile" not in response.headers)
+        ok_(len(os.listdir(directory)) == 1, "Stream was profiled.")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _profiles(self, extension):
+        return [
+            os.path.join(self.directory, filename)
+            for filename in os.listdir(self.directory)
+            if filename.endswith(extension)
+        ]
+
+
+def _busy(duration):
+    end_time = time.time() + duration
+    while time.time() < end_time:
+        pass
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for the retry delays and the circuit breaker.
+"""
+
+# STD
+import time
+from unittest import TestCase
+
+# EXT
+from nose.tools import ok_
+
+# PROJECT
+from hackerbabel.src.resilience import backoff_delay, CircuitBreaker
+
+
+class ResilienceTestCase(TestCase):
+    """
+    Test the backoff delays and the states of the circuit breaker.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ResilienceTestCase, self).__init__()
+
+    def runTest(self):
+        self.test_backoff_delay()
+        self.test_circuit_breaker()
+        self.test_unanswered_trial()
+
+    def test_backoff_delay(self):
+        """
+        Test whether delays stay within the exponentially growing bounds.
+        """
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base_delay=1, max_delay=30)
+            ok_(0 <= delay <= min(2 ** attempt, 30))
+
+    def test_circuit_breaker(self):
+        """
+        Test whether the circuit opens after too many failures, lets a trial
+        request through after the reset timeout and closes again.
+        """
+        self.circuit_breaker.record_failure()
+        ok_(self.circuit_breaker.state == CircuitBreaker.CLOSED)
+        self.circuit_breaker.record_failure()
+        ok_(self.circuit_breaker.state == CircuitBreaker.OPEN)
+
+        start = time.time()
+        self.circuit_breaker.wait()
+        ok_(time.time() - start >= 0.1, "Circuit didn't block the request.")
+        ok_(self.circuit_breaker.state == CircuitBreaker.HALF_OPEN)
+
+        # Failed trial request opens the circuit again immediately
+        self.circuit_breaker.record_failure()
+        ok_(self.circuit_breaker.state == CircuitBreaker.OPEN)
+
+        self.circuit_breaker.wait()
+        self.circuit_breaker.record_success()
+        ok_(self.circuit_breaker.state == CircuitBreaker.CLOSED)
+        ok_(self.circuit_breaker.statistics()["trips"] == 2)
+
+    def test_unanswered_trial(self):
+        """
+        Test whether callers stop waiting for a trial request that never
+        reports its outcome.
+        """
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.wait()  # Trial request that never reports back
+
+        start = time.time()
+        self.circuit_breaker.wait()
+        ok_(time.time() - start >= 0.1, "Trial request wasn't waited for.")
+        ok_(self.circuit_breaker.state == CircuitBreaker.HALF_OPEN)
+
+    def setUp(self):
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=2, reset_timeout=0.1
+        )
@@ -5,12 +5,22 @@ View for a commentary section concerning a news article.
 """
 
 # EXT
-from flask import render_template, Blueprint
+from flask import (
+    abort, current_app, jsonify, render_template, request, Blueprint
+)
 
 # PROJECT
-from hackerbabel.cache import cache
-from hackerbabel.src.helpers import get_story
+from hackerbabel.cache import cache, comment_section_key
+from hackerbabel.src.helpers import (
+    get_comment_page,
+    get_comment_subtree,
+    get_story
+)
+from hackerbabel.src.versioning import comment_section_version, conditional
 from hackerbabel.config import (
+    COMMENT_COLLECTION,
+    COMMENTS_PER_PAGE,
+    PAGE_CACHE_TIMEOUT,
     REFRESH_INTERVAL,
     SOURCE_LANGUAGE,
     STORY_COLLECTION
@@ -23,16 +33,70 @@ COMMENT_SECTION = Blueprint(
 )
 
 
-@cache.cached(timeout=REFRESH_INTERVAL)
 @COMMENT_SECTION.route('/comments')
+@conditional(
+    lambda story_id: comment_section_version(int(story_id), STORY_COLLECTION)
+)
+@cache.cached(timeout=PAGE_CACHE_TIMEOUT, key_prefix=comment_section_key)
 def comment_section(story_id):
     """
-    View of a comment section under a news article.
+    View of a comment section under a news article. Only the first page of
+    top level comments is rendered, further pages and replies are loaded
+    on demand.
     """
+    story = get_story(int(story_id), STORY_COLLECTION)
+    comments = current_app.extensions["fragments"].comments_fragment(
+        story, lambda: get_comment_page(
+            int(story_id), COMMENT_COLLECTION, 1, COMMENTS_PER_PAGE
+        )
+    )
+
     return render_template(
         "comment_section.html",
         story_id=story_id,
-        story=get_story(int(story_id), STORY_COLLECTION),
+        story=story,
+        comments=comments,
         interval=REFRESH_INTERVAL,
         source=SOURCE_LANGUAGE
     )
+
+
+@COMMENT_SECTION.route('/comments.json')
+def comment_page(story_id):
+    """
+    Page of top level comments under a news article as JSON. Supports the
+    query parameters "page" (starting at 1) and "per_page".
+    """
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(
+        max(request.args.get("per_page", COMMENTS_PER_PAGE, type=int), 1),
+        COMMENTS_PER_PAGE * 5
+    )
+    comments, total = get_comment_page(
+        int(story_id), COMMENT_COLLECTION, page, per_page
+    )
+
+    return jsonify(
+        story_id=int(story_id),
+        page=page,
+        per_page=per_page,
+        total=total,
+        comments=comments
+    )
+
+
+@COMMENT_SECTION.route('/comments/<int:comment_id>.json')
+def comment_subtree(story_id, comment_id):
+    """
+    All replies to a comment as a tree in JSON.
+    """
+    replies = get_comment_subtree(int(story_id), comment_id, COMMENT_COLLECTION)
+
+    if replies is None:
+        abort(404)
+
+    return jsonify(
+        story_id=int(story_id),
+        comment_id=comment_id,
+        replies=replies
+    )
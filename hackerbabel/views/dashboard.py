@@ -6,12 +6,16 @@ translation status of the news stories' headlines.
 """
 
 # EXT
-from flask import render_template, Blueprint
+from flask import current_app, render_template, request, Blueprint, Response
 
 # PROJECT
-from hackerbabel.cache import cache
+from hackerbabel.cache import cache, DASHBOARD_KEY
+from hackerbabel.src.events import event_broker
 from hackerbabel.src.helpers import get_stories
+from hackerbabel.src.versioning import conditional, story_list_version
 from hackerbabel.config import (
+    EVENT_KEEPALIVE,
+    PAGE_CACHE_TIMEOUT,
     REFRESH_INTERVAL,
     SOURCE_LANGUAGE,
     STORY_COLLECTION
@@ -21,15 +25,35 @@ from hackerbabel.config import (
 DASHBOARD = Blueprint('dashboard', __name__)
 
 
-@cache.cached(timeout=REFRESH_INTERVAL/10.0)
 @DASHBOARD.route('/dashboard')
+@conditional(lambda: story_list_version(STORY_COLLECTION, "dashboard"))
+@cache.cached(timeout=PAGE_CACHE_TIMEOUT, key_prefix=DASHBOARD_KEY)
 def dashboard():
     """
     Dashboard view.
     """
+    fragment_renderer = current_app.extensions["fragments"]
     return render_template(
         "dashboard.html",
-        stories=get_stories(STORY_COLLECTION),
+        fragments=fragment_renderer.story_fragments(
+            get_stories(STORY_COLLECTION), "dashboard"
+        ),
         interval=REFRESH_INTERVAL/10.0,
         source=SOURCE_LANGUAGE
     )
+
+
+@DASHBOARD.route('/dashboard/events')
+def dashboard_events():
+    """
+    Stream of changes to the dashboard as server-sent events: "translation"
+    events when the translation status or title of a story changes and
+    "stories" events when the listed stories changed.
+    """
+    return Response(
+        event_broker.stream(
+            request.headers.get("Last-Event-ID", type=int), EVENT_KEEPALIVE
+        ),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
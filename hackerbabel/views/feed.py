@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact JSON feed of the stories currently on the front page.
+"""
+
+# STD
+import hashlib
+import json
+
+# EXT
+from flask import Blueprint, Response
+
+# PROJECT
+from hackerbabel.cache import cache, FEED_KEY, version_key
+from hackerbabel.src.helpers import get_stories
+from hackerbabel.src.versioning import conditional
+from hackerbabel.config import (
+    PAGE_CACHE_TIMEOUT,
+    SOURCE_LANGUAGE,
+    STORY_COLLECTION
+)
+
+# CONST
+FEED = Blueprint('feed', __name__)
+
+
+def feed_body():
+    """
+    Return the cached feed or create it from the stored stories.
+
+    @return: Feed as JSON.
+    @rtype: str
+    """
+    body = cache.get(FEED_KEY)
+
+    if body is None:
+        stories = [
+            {
+                "id": story["id"],
+                "rank": story.get("rank", rank) + 1,
+                "url": story.get("url"),
+                "score": story.get("score"),
+                "author": story.get("author"),
+                "comments": story.get("descendants", 0),
+                "titles": {
+                    lang: info["title"]
+                    for lang, info in story["titles"].items()
+                    if info["translation_status"] == "done"
+                }
+            }
+            for rank, story in enumerate(get_stories(STORY_COLLECTION))
+        ]
+        body = json.dumps(
+            {"source": SOURCE_LANGUAGE, "stories": stories},
+            separators=(",", ":")
+        )
+        cache.set(FEED_KEY, body, timeout=PAGE_CACHE_TIMEOUT)
+
+    return body
+
+
+def feed_version():
+    """
+    Version of the feed, derived from the feed itself: It contains fields the
+    fragments of the index page don't show, e.g. the number of comments.
+
+    @return: ETag and no time of the last modification.
+    @rtype: tuple
+    """
+    key = version_key(FEED_KEY)
+    version = cache.get(key)
+
+    if version is None:
+        version = hashlib.sha1(feed_body().encode("utf-8")).hexdigest(), None
+        cache.set(key, version)
+
+    return version
+
+
+@FEED.route('/feed.json')
+@conditional(feed_version, prefix="feed-")
+def feed():
+    """
+    Front page as JSON: Every story with its rank, link, score, author, number
+    of comments and its titles in all languages it has been translated into.
+    """
+    return Response(feed_body(), mimetype="application/json")
@@ -5,12 +5,14 @@ View for index / main page.
 """
 
 # EXT
-from flask import render_template, Blueprint
+from flask import current_app, render_template, Blueprint
 
 # PROJECT
 from hackerbabel.src.helpers import get_stories
-from hackerbabel.cache import cache
+from hackerbabel.src.versioning import conditional, story_list_version
+from hackerbabel.cache import cache, INDEX_KEY
 from hackerbabel.config import (
+    PAGE_CACHE_TIMEOUT,
     REFRESH_INTERVAL,
     SOURCE_LANGUAGE,
     STORY_COLLECTION
@@ -20,17 +22,21 @@ from hackerbabel.config import (
 INDEX = Blueprint('index', __name__)
 
 
-@cache.cached(timeout=REFRESH_INTERVAL)
 @INDEX.route('/')
 @INDEX.route('/index.html')
 @INDEX.route('/start')
+@conditional(lambda: story_list_version(STORY_COLLECTION, "index"))
+@cache.cached(timeout=PAGE_CACHE_TIMEOUT, key_prefix=INDEX_KEY)
 def index():
     """
     Main view
     """
+    fragment_renderer = current_app.extensions["fragments"]
     return render_template(
         "index.html",
-        stories=get_stories(STORY_COLLECTION),
+        fragments=fragment_renderer.story_fragments(
+            get_stories(STORY_COLLECTION), "index"
+        ),
         interval=REFRESH_INTERVAL,
         source=SOURCE_LANGUAGE
     )
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+"""
+Metrics of the whole pipeline in the text format of Prometheus, together with
+the duration of every request to the app.
+"""
+
+# STD
+import time
+
+# EXT
+from flask import g, request, Blueprint, Response
+
+# PROJECT
+from hackerbabel.src.metrics import registry
+
+# CONST
+METRICS = Blueprint('metrics', __name__)
+REQUEST_SECONDS = registry.histogram(
+    "hackerbabel_request_seconds", "Duration of requests, by endpoint.",
+    labels=("endpoint", )
+)
+REQUESTS = registry.counter(
+    "hackerbabel_requests_total", "Requests by endpoint and status code.",
+    labels=("endpoint", "status")
+)
+
+
+@METRICS.before_app_request
+def start_request_timer():
+    g.request_start_time = time.time()
+
+
+@METRICS.after_app_request
+def observe_request(response):
+    """
+    Add the duration of a request to the metrics. Streamed responses, e.g.
+    server-sent events, are observed once their headers are ready.
+    """
+    start_time = getattr(g, "request_start_time", None)
+    endpoint = request.endpoint or "unknown"
+
+    if start_time is not None:
+        REQUEST_SECONDS.observe(time.time() - start_time, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+
+    return response
+
+
+@METRICS.route('/metrics')
+def metrics():
+    """
+    Current values of all metrics of this process.
+    """
+    return Response(
+        registry.render(), content_type="text/plain; version=0.0.4"
+    )